@@ -0,0 +1,250 @@
+"""
+Analytics Worker
+Applies analytics aggregates from the passage stream through a Redis consumer group
+
+With ANALYTICS_AGGREGATION=worker the app only appends passages to
+cloze:analytics:stream; this process reads them with XREADGROUP, updates the
+word/book/session/rollup aggregates and XACKs them in one MULTI/EXEC. Run as
+many processes as needed; each gets a unique consumer name (hostname-pid-random
+unless --consumer is given), so two processes never share and re-apply each
+other's pending entries. Entries left pending by a crashed consumer are
+reclaimed with XAUTOCLAIM once idle long enough, and consumers that went idle
+with nothing pending are removed from the group.
+
+Usage:
+    python analytics_worker.py
+    python analytics_worker.py --consumer worker-2
+    python analytics_worker.py --from-start   # replay the retained stream into a new group
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from redis_analytics import RedisAnalyticsService
+
+logger = logging.getLogger(__name__)
+
+
+def _stream_entries(response) -> List[Tuple[str, Optional[Dict]]]:
+    """Flatten an XREADGROUP reply into (id, fields); fields are None for trimmed entries"""
+    entries = []
+    for _, stream_entries in response or []:
+        entries.extend(stream_entries)
+    return entries
+
+
+class AnalyticsWorker:
+    """
+    Consumer-group reader that applies analytics aggregates.
+    Own pending entries are replayed first after a restart, then new entries
+    are read; every `claim_interval` seconds entries idle for longer than
+    `claim_idle_ms` on any consumer are claimed and applied here.
+    """
+
+    def __init__(
+        self,
+        service: RedisAnalyticsService,
+        consumer: str,
+        batch_size: int = 100,
+        block_ms: int = 5000,
+        claim_idle_ms: int = 60000,
+        claim_interval: float = 30.0,
+        start_id: str = "$",
+    ):
+        """
+        Initialize Analytics Worker
+
+        Args:
+            service: Connected analytics service in "worker" aggregation mode
+            consumer: Consumer name, unique per process
+            batch_size: Entries read and applied per MULTI/EXEC
+            block_ms: XREADGROUP block time when the stream is idle
+            claim_idle_ms: Idle time after which another consumer's pending entry is reclaimed
+            claim_interval: Seconds between XAUTOCLAIM sweeps
+            start_id: Where a newly created group starts ("$" new entries only, "0" replay)
+        """
+        self.service = service
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.claim_interval = claim_interval
+        self.start_id = start_id
+        self._last_claim = 0.0
+        self.stats = {"applied": 0, "acked": 0, "claimed": 0}
+
+    @property
+    def _redis(self):
+        return self.service.redis_client
+
+    @property
+    def _group(self) -> str:
+        return self.service.CONSUMER_GROUP
+
+    async def _apply(self, entries: List[Tuple[str, Optional[Dict]]]) -> None:
+        if not entries:
+            return
+        self.stats["applied"] += await self.service.apply_stream_entries(entries, self._group)
+        self.stats["acked"] += len(entries)
+
+    async def recover_own_pending(self) -> None:
+        """Re-apply entries delivered to this consumer name but never acked"""
+        while True:
+            response = await self._redis.xreadgroup(
+                self._group, self.consumer, {self.service.STREAM_KEY: "0"}, count=self.batch_size
+            )
+            entries = _stream_entries(response)
+            if not entries:
+                return
+            await self._apply(entries)
+
+    async def claim_stale(self) -> None:
+        """XAUTOCLAIM entries other consumers left pending for too long"""
+        cursor = "0-0"
+        while True:
+            reply = await self._redis.xautoclaim(
+                self.service.STREAM_KEY,
+                self._group,
+                self.consumer,
+                self.claim_idle_ms,
+                start_id=cursor,
+                count=self.batch_size,
+            )
+            cursor, entries = reply[0], reply[1]
+            # Redis 7 also reports IDs that were trimmed while pending
+            deleted = reply[2] if len(reply) > 2 else []
+            claimed = list(entries) + [(entry_id, None) for entry_id in deleted]
+            if claimed:
+                self.stats["claimed"] += len(claimed)
+                logger.info(f"Claimed {len(claimed)} stale analytics entries")
+                await self._apply(claimed)
+            if cursor in ("0-0", b"0-0"):
+                break
+        await self._prune_consumers()
+
+    async def _prune_consumers(self) -> None:
+        """Drop consumers of exited processes once they have nothing pending"""
+        for info in await self._redis.xinfo_consumers(self.service.STREAM_KEY, self._group):
+            name = info["name"]
+            if name != self.consumer and not info["pending"] and info["idle"] > self.claim_idle_ms:
+                await self._redis.xgroup_delconsumer(self.service.STREAM_KEY, self._group, name)
+
+    async def run_once(self) -> int:
+        """Claim stale entries when due, then read and apply one batch of new entries"""
+        if time.monotonic() - self._last_claim >= self.claim_interval:
+            self._last_claim = time.monotonic()
+            await self.claim_stale()
+
+        response = await self._redis.xreadgroup(
+            self._group,
+            self.consumer,
+            {self.service.STREAM_KEY: ">"},
+            count=self.batch_size,
+            block=self.block_ms,
+        )
+        entries = _stream_entries(response)
+        await self._apply(entries)
+        return len(entries)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        started = False
+        delay = 1.0
+        while not stop.is_set():
+            try:
+                if not started:
+                    await self.service.ensure_consumer_group(self.start_id)
+                    await self.recover_own_pending()
+                    started = True
+                    logger.info(f"Analytics worker {self.consumer} consuming {self.service.STREAM_KEY}")
+                await self.run_once()
+                delay = 1.0
+            except redis.ResponseError:
+                # NOGROUP: the stream was deleted (e.g. analytics cleared).
+                # Start the new group at 0 so entries appended since the
+                # delete are applied; any other error is re-raised.
+                if not await self.service.ensure_consumer_group("0"):
+                    raise
+                logger.warning("Consumer group was missing, recreated from the stream start")
+            except redis.RedisError as e:
+                logger.error(f"Redis error, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+        logger.info(f"Analytics worker stopped: {self.stats}")
+
+
+async def _main(args) -> None:
+    if not args.redis_url:
+        raise SystemExit("Redis unavailable; set REDIS_URL")
+    # No socket timeout: XREADGROUP blocks for up to --block-ms, and a read
+    # timeout at or below that would fail every idle poll
+    pool = aioredis.ConnectionPool.from_url(
+        args.redis_url,
+        decode_responses=True,
+        socket_connect_timeout=5,
+        socket_timeout=None,
+        socket_keepalive=True,
+    )
+    service = RedisAnalyticsService(
+        redis_url=args.redis_url,
+        session_counting=os.getenv("ANALYTICS_SESSION_COUNTING", "hll"),
+        aggregation="worker",
+    )
+    await service.connect(pool)
+    if not service.connected:
+        await pool.disconnect()
+        raise SystemExit("Redis unavailable; set REDIS_URL")
+
+    worker = AnalyticsWorker(
+        service,
+        consumer=args.consumer,
+        batch_size=args.batch,
+        block_ms=args.block_ms,
+        claim_idle_ms=args.claim_idle_ms,
+        start_id="0" if args.from_start else "$",
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    try:
+        await worker.run(stop)
+    finally:
+        await service.close()
+        await pool.disconnect()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply analytics aggregates from the passage stream")
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    parser.add_argument(
+        "--consumer",
+        default=os.getenv("ANALYTICS_CONSUMER")
+        or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}",
+        help="Consumer name, unique per process (default: ANALYTICS_CONSUMER or hostname-pid-random)",
+    )
+    parser.add_argument("--batch", type=int, default=100, help="Entries per read/apply batch")
+    parser.add_argument("--block-ms", type=int, default=5000, help="XREADGROUP block time")
+    parser.add_argument("--claim-idle-ms", type=int, default=60000, help="Reclaim entries pending this long")
+    parser.add_argument("--from-start", action="store_true", help="New group replays the retained stream")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,22 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import os
-import time
+import io
+import csv
 import json
 import asyncio
-import urllib.request
+import random
+import re
 import urllib.parse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import logging
+import httpx
+from datetime import datetime
+import redis.asyncio as aioredis
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,12 +24,36 @@ load_dotenv()
 # Import Leaderboard Services (Redis primary, HF fallback)
 from redis_leaderboard import RedisLeaderboardService
 from redis_analytics import RedisAnalyticsService
+from proxy_cache import ProxyCache
+from book_corpus import LocalCorpus
+from http_caching import (
+    CachedStaticFiles,
+    CompressionMiddleware,
+    ICON_CACHE_CONTROL,
+    PreparedJSON,
+    RenderedPage,
+    cached_file_response,
+)
+from passage_pool import PassagePool, extract_metadata
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await _connect_redis_services()
+    if os.path.exists(PASSAGE_POOL_FILE):
+        await asyncio.to_thread(passage_pool.load, PASSAGE_POOL_FILE)
+    yield
+    await _close_redis_services()
+    # Close pooled upstream connections on shutdown
+    await _close_http_client()
+    if _local_corpus is not None:
+        _local_corpus.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware for local development
 app.add_middleware(
@@ -35,6 +64,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress text-like responses (JSON, JS, CSS, HTML) above 1KB with br/gzip
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+)
+
 # Initialize Leaderboard Service (Redis primary, HF Space fallback)
 # REDIS_URL is auto-injected by Railway when Redis plugin is added
 try:
@@ -42,11 +77,9 @@ try:
         redis_url=os.getenv("REDIS_URL"),
         hf_fallback_url="https://milwright-cloze-leaderboard.hf.space",
         hf_token=os.getenv("HF_TOKEN"),
+        cache_ttl=float(os.getenv("LEADERBOARD_CACHE_TTL", "30")),
+        sync_debounce=float(os.getenv("LEADERBOARD_SYNC_DEBOUNCE", "2")),
     )
-    if leaderboard_service.is_redis_available():
-        logger.info("Leaderboard using Redis (primary) with HF Space (fallback)")
-    else:
-        logger.info("Leaderboard using HF Space (Redis unavailable)")
 except Exception as e:
     logger.warning(f"Could not initialize Leaderboard Service: {e}")
     logger.warning("Leaderboard will use localStorage fallback only")
@@ -54,15 +87,66 @@ except Exception as e:
 
 # Initialize Analytics Service (Redis)
 try:
-    analytics_service = RedisAnalyticsService(redis_url=os.getenv("REDIS_URL"))
-    if analytics_service.is_available():
-        logger.info("Analytics Service using Redis")
-    else:
-        logger.info("Analytics Service unavailable (Redis not connected)")
+    analytics_service = RedisAnalyticsService(
+        redis_url=os.getenv("REDIS_URL"),
+        session_counting=os.getenv("ANALYTICS_SESSION_COUNTING", "hll"),
+        # "worker": requests only append to the stream; analytics_worker.py aggregates
+        aggregation=os.getenv("ANALYTICS_AGGREGATION", "inline"),
+        # Opt-in: buffer passages in memory and write them to Redis in batches
+        write_behind=os.getenv("ANALYTICS_WRITE_BEHIND", "0").lower() in ("1", "true", "yes"),
+        buffer_size=int(os.getenv("ANALYTICS_BUFFER_SIZE", "10000")),
+        flush_batch=int(os.getenv("ANALYTICS_FLUSH_BATCH", "200")),
+        flush_interval=float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "1.0")),
+    )
 except Exception as e:
     logger.warning(f"Could not initialize Analytics Service: {e}")
     analytics_service = None
 
+# One asyncio connection pool shared by both services. It is created in the
+# lifespan (not at import) so it binds to the server's event loop.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+redis_pool: Optional[aioredis.ConnectionPool] = None
+
+
+async def _connect_redis_services():
+    global redis_pool
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        # Blocking pool: past max_connections callers wait for a free
+        # connection instead of failing with "Too many connections"
+        redis_pool = aioredis.BlockingConnectionPool.from_url(
+            redis_url,
+            decode_responses=True,
+            socket_connect_timeout=5,
+            socket_timeout=5,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=5,
+        )
+
+    if leaderboard_service:
+        await leaderboard_service.connect(redis_pool)
+        if leaderboard_service.redis_client:
+            logger.info("Leaderboard using Redis (primary) with HF Space (fallback)")
+        else:
+            logger.info("Leaderboard using HF Space (Redis unavailable)")
+
+    if analytics_service:
+        await analytics_service.connect(redis_pool)
+        if analytics_service.connected:
+            logger.info("Analytics Service using Redis")
+        else:
+            logger.info("Analytics Service unavailable (Redis not connected)")
+
+
+async def _close_redis_services():
+    global redis_pool
+    for service in (leaderboard_service, analytics_service):
+        if service:
+            await service.close()
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+        redis_pool = None
+
 # Pydantic models for API
 class LeaderboardEntry(BaseModel):
     initials: str
@@ -87,6 +171,11 @@ class WordAnalytics(BaseModel):
     finalCorrect: bool = False
 
 
+class WordStatsRequest(BaseModel):
+    words: List[str]
+    window: Optional[str] = None
+
+
 class PassageAnalytics(BaseModel):
     passageId: str
     sessionId: str
@@ -101,61 +190,61 @@ class PassageAnalytics(BaseModel):
     passed: bool
     timestamp: Optional[str] = None
 
-# Mount static files
-app.mount("/src", StaticFiles(directory="src"), name="src")
+# Mount static files (strong ETags + revalidation; see http_caching.py)
+app.mount("/src", CachedStaticFiles(directory="src"), name="src")
 
 @app.get("/icon.png")
-async def get_icon():
+async def get_icon(request: Request):
     """Serve the app icon locally if available, else fallback to GitHub."""
     local_icon = "icon.png"
     if os.path.exists(local_icon):
-        return FileResponse(local_icon, media_type="image/png")
+        return cached_file_response(request.headers, local_icon, media_type="image/png")
     # Fallback to GitHub-hosted icon
     return RedirectResponse(url="https://media.githubusercontent.com/media/milwrite/cloze-reader/main/icon.png")
 
 @app.get("/favicon.png")
-async def get_favicon_png():
+async def get_favicon_png(request: Request):
     """Serve favicon as PNG by pointing to the canonical PNG icon."""
-    return await get_icon()
+    return await get_icon(request)
 
 @app.get("/favicon.ico")
-async def get_favicon_ico():
+async def get_favicon_ico(request: Request):
     """Serve an ICO route that points to our PNG so browsers can find it."""
     # Many browsers request /favicon.ico explicitly; return PNG is acceptable
-    return await get_favicon_png()
+    return await get_favicon_png(request)
 
 @app.get("/favicon.svg")
-async def get_favicon_svg():
+async def get_favicon_svg(request: Request):
     """Serve SVG favicon for browsers that support it."""
     # Prefer `icon.svg` if available
     for candidate in ["favicon.svg", "icon.svg"]:
         if os.path.exists(candidate):
-            return FileResponse(candidate, media_type="image/svg+xml")
+            return cached_file_response(request.headers, candidate, media_type="image/svg+xml")
     # If missing, fall back to PNG icon
-    return await get_favicon_png()
+    return await get_favicon_png(request)
 
 @app.get("/icon.svg")
-async def get_icon_svg():
+async def get_icon_svg(request: Request):
     """Serve the SVG icon at /icon.svg if present, else fallback to PNG."""
     candidate = "icon.svg"
     if os.path.exists(candidate):
-        return FileResponse(candidate, media_type="image/svg+xml")
-    return await get_icon()
+        return cached_file_response(request.headers, candidate, media_type="image/svg+xml")
+    return await get_icon(request)
 
 @app.get("/apple-touch-icon.png")
-async def get_apple_touch_icon():
+async def get_apple_touch_icon(request: Request):
     """Serve Apple touch icon, fallback to main icon."""
     candidate = "apple-touch-icon.png"
     if os.path.exists(candidate):
-        return FileResponse(candidate, media_type="image/png")
-    return await get_icon()
+        return cached_file_response(request.headers, candidate, media_type="image/png")
+    return await get_icon(request)
 
 @app.get("/site.webmanifest")
-async def site_manifest():
+async def site_manifest(request: Request):
     """Serve the web app manifest if present, else a minimal generated one."""
     manifest_path = "site.webmanifest"
     if os.path.exists(manifest_path):
-        return FileResponse(manifest_path, media_type="application/manifest+json")
+        return cached_file_response(request.headers, manifest_path, media_type="application/manifest+json")
     # Minimal default manifest
     content = {
         "name": "Cloze Reader",
@@ -169,59 +258,74 @@ async def site_manifest():
         "background_color": "#ffffff",
         "theme_color": "#2c2826"
     }
-    return JSONResponse(content=content, media_type="application/manifest+json")
+    return JSONResponse(
+        content=content,
+        media_type="application/manifest+json",
+        headers={"Cache-Control": ICON_CACHE_CONTROL},
+    )
 
 @app.get("/icon-192.png")
-async def get_icon_192():
+async def get_icon_192(request: Request):
     path = "icon-192.png"
     if os.path.exists(path):
-        return FileResponse(path, media_type="image/png")
-    return await get_icon()
+        return cached_file_response(request.headers, path, media_type="image/png")
+    return await get_icon(request)
 
 @app.get("/icon-512.png")
-async def get_icon_512():
+async def get_icon_512(request: Request):
     path = "icon-512.png"
     if os.path.exists(path):
-        return FileResponse(path, media_type="image/png")
-    return await get_icon()
+        return cached_file_response(request.headers, path, media_type="image/png")
+    return await get_icon(request)
 
-@app.get("/admin")
-async def admin_dashboard():
-    """Serve the analytics admin dashboard"""
-    with open("admin.html", "r") as f:
-        return HTMLResponse(content=f.read())
-
-
-@app.get("/")
-async def read_root():
-    # Read the HTML file and inject environment variables
-    with open("index.html", "r") as f:
-        html_content = f.read()
-    
-    # Inject environment variables as a script
+def _inject_env(html_content: str) -> str:
+    """Inject environment variables as meta tags before </head>"""
     openrouter_key = os.getenv("OPENROUTER_API_KEY", "")
     hf_key = os.getenv("HF_API_KEY", "")
-    
+
     # Create a CSP-compliant way to inject the keys
     env_script = f"""
     <meta name="openrouter-key" content="{openrouter_key}">
     <meta name="hf-key" content="{hf_key}">
     <script src="./src/init-env.js"></script>
     """
-    
+
     # Insert the script before closing head tag
-    html_content = html_content.replace("</head>", env_script + "</head>")
-    
-    return HTMLResponse(content=html_content)
+    return html_content.replace("</head>", env_script + "</head>")
+
+
+# Pages are rendered once into pre-encoded bytes and re-rendered only when the
+# file changes, so the hottest route does no disk I/O on the event loop
+HTML_RELOAD_INTERVAL = float(os.getenv("HTML_RELOAD_INTERVAL", "2"))
+index_page = RenderedPage("index.html", render=_inject_env, check_interval=HTML_RELOAD_INTERVAL)
+admin_page = RenderedPage("admin.html", check_interval=HTML_RELOAD_INTERVAL)
+
+
+@app.get("/admin")
+async def admin_dashboard(request: Request):
+    """Serve the analytics admin dashboard"""
+    return admin_page.response(request.headers)
+
+
+@app.get("/")
+async def read_root(request: Request):
+    return index_page.response(request.headers)
 
 
 # ===== LEADERBOARD API ENDPOINTS =====
 
+# Serialized response for the board object last returned by the service;
+# the service hands back the same list until the board changes
+_leaderboard_response: Optional[Tuple[List[Dict], PreparedJSON]] = None
+
+
 @app.get("/api/leaderboard", response_model=LeaderboardResponse)
-async def get_leaderboard():
+async def get_leaderboard(request: Request):
     """
-    Get current leaderboard data (Redis primary, HF Space fallback)
+    Get current leaderboard data (Redis primary, HF Space fallback).
+    Served with an ETag; conditional requests get a 304.
     """
+    global _leaderboard_response
     if not leaderboard_service:
         return {
             "success": True,
@@ -230,12 +334,14 @@ async def get_leaderboard():
         }
 
     try:
-        leaderboard = leaderboard_service.get_leaderboard()
-        return {
-            "success": True,
-            "leaderboard": leaderboard,
-            "message": f"Retrieved {len(leaderboard)} entries"
-        }
+        leaderboard = await leaderboard_service.get_leaderboard()
+        if _leaderboard_response is None or _leaderboard_response[0] is not leaderboard:
+            _leaderboard_response = (leaderboard, PreparedJSON({
+                "success": True,
+                "leaderboard": leaderboard,
+                "message": f"Retrieved {len(leaderboard)} entries"
+            }))
+        return _leaderboard_response[1].response(request.headers)
     except Exception as e:
         logger.error(f"Error fetching leaderboard: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -250,14 +356,22 @@ async def add_leaderboard_entry(entry: LeaderboardEntry):
         raise HTTPException(status_code=503, detail="Leaderboard service not available")
 
     try:
-        success = leaderboard_service.add_entry(entry.dict())
-        if success:
+        result = await leaderboard_service.add_entry(entry.dict())
+        if result is None:
+            raise HTTPException(status_code=500, detail="Failed to add entry")
+        if not result["qualified"]:
             return {
                 "success": True,
-                "message": f"Added {entry.initials} to leaderboard"
+                "qualified": False,
+                "rank": None,
+                "message": f"{entry.initials} did not place on the leaderboard"
             }
-        else:
-            raise HTTPException(status_code=500, detail="Failed to add entry")
+        return {
+            "success": True,
+            "qualified": True,
+            "rank": result["rank"],
+            "message": f"Added {entry.initials} to leaderboard"
+        }
     except ValueError as e:
         raise HTTPException(status_code=403, detail=str(e))
     except Exception as e:
@@ -265,6 +379,22 @@ async def add_leaderboard_entry(entry: LeaderboardEntry):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/leaderboard/qualifies")
+async def leaderboard_qualifies(
+    level: int = Query(..., ge=1),
+    round: int = Query(..., ge=1),
+    passagesPassed: int = Query(0, ge=0),
+):
+    """
+    Check whether a score would place on the leaderboard, without writing
+    """
+    if not leaderboard_service:
+        raise HTTPException(status_code=503, detail="Leaderboard service not available")
+
+    qualifies = await leaderboard_service.qualifies(level, round, passagesPassed)
+    return {"success": True, "qualifies": qualifies}
+
+
 @app.post("/api/leaderboard/update")
 async def update_leaderboard(entries: List[LeaderboardEntry]):
     """
@@ -274,7 +404,7 @@ async def update_leaderboard(entries: List[LeaderboardEntry]):
         raise HTTPException(status_code=503, detail="Leaderboard service not available")
 
     try:
-        success = leaderboard_service.update_leaderboard([e.dict() for e in entries])
+        success = await leaderboard_service.update_leaderboard([e.dict() for e in entries])
         if success:
             return {
                 "success": True,
@@ -298,7 +428,7 @@ async def clear_leaderboard():
         raise HTTPException(status_code=503, detail="Leaderboard service not available")
 
     try:
-        success = leaderboard_service.clear_leaderboard()
+        success = await leaderboard_service.clear_leaderboard()
         if success:
             return {
                 "success": True,
@@ -313,6 +443,17 @@ async def clear_leaderboard():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/leaderboard/sync-status")
+async def leaderboard_sync_status():
+    """
+    HF Space backup sync status: pending changes, lag, last success and errors,
+    plus the state of the HF Space circuit breaker
+    """
+    if not leaderboard_service:
+        raise HTTPException(status_code=503, detail="Leaderboard service not available")
+    return {"success": True, "data": leaderboard_service.sync_status()}
+
+
 @app.post("/api/leaderboard/seed-from-hf")
 async def seed_leaderboard_from_hf():
     """
@@ -323,9 +464,9 @@ async def seed_leaderboard_from_hf():
         raise HTTPException(status_code=503, detail="Leaderboard service not available")
 
     try:
-        success = leaderboard_service.force_seed_from_hf()
+        success = await leaderboard_service.force_seed_from_hf()
         if success:
-            leaderboard = leaderboard_service.get_leaderboard()
+            leaderboard = await leaderboard_service.get_leaderboard()
             return {
                 "success": True,
                 "message": f"Seeded Redis with {len(leaderboard)} entries from HF Space",
@@ -349,7 +490,7 @@ async def record_passage_analytics(data: PassageAnalytics):
     Record a completed passage attempt with analytics data.
     Called by frontend when a passage is completed (pass or fail).
     """
-    if not analytics_service or not analytics_service.is_available():
+    if not analytics_service or not analytics_service.connected:
         # Gracefully degrade - don't fail the game if analytics unavailable
         return {
             "success": False,
@@ -361,7 +502,15 @@ async def record_passage_analytics(data: PassageAnalytics):
         data_dict = data.dict()
         data_dict["words"] = [w.dict() for w in data.words]
 
-        entry_id = analytics_service.record_passage(data_dict)
+        if analytics_service.buffering:
+            queued = await analytics_service.enqueue_passage(data_dict)
+            return {
+                "success": queued,
+                "queued": queued,
+                "message": "Passage analytics queued" if queued else "Analytics buffer full"
+            }
+
+        entry_id = await analytics_service.record_passage(data_dict)
         if entry_id:
             return {
                 "success": True,
@@ -382,11 +531,144 @@ async def record_passage_analytics(data: PassageAnalytics):
         }
 
 
+# Upper bound on passages accepted by one batch request
+ANALYTICS_MAX_BATCH = 500
+
+
+@app.post("/api/analytics/passages")
+async def record_passages_analytics(items: List[PassageAnalytics]):
+    """
+    Record a batch of completed passages in one request.
+    Written with a single pipelined round trip, or queued when the
+    write-behind buffer is enabled.
+    """
+    if len(items) > ANALYTICS_MAX_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {ANALYTICS_MAX_BATCH} passages per batch",
+        )
+
+    if not analytics_service or not analytics_service.connected:
+        return {
+            "success": False,
+            "recorded": 0,
+            "message": "Analytics service unavailable"
+        }
+
+    try:
+        data_dicts = []
+        for item in items:
+            data_dict = item.dict()
+            data_dict["words"] = [w.dict() for w in item.words]
+            data_dicts.append(data_dict)
+
+        if analytics_service.buffering:
+            queued = 0
+            for data_dict in data_dicts:
+                if await analytics_service.enqueue_passage(data_dict):
+                    queued += 1
+            return {
+                "success": queued == len(data_dicts),
+                "queued": queued,
+                "dropped": len(data_dicts) - queued,
+                "message": f"Queued {queued} of {len(data_dicts)} passages"
+            }
+
+        entry_ids = await analytics_service.record_passages(data_dicts)
+        recorded = sum(1 for entry_id in entry_ids if entry_id)
+        return {
+            "success": recorded == len(data_dicts),
+            "recorded": recorded,
+            "entryIds": entry_ids,
+            "message": f"Recorded {recorded} of {len(data_dicts)} passages"
+        }
+    except Exception as e:
+        logger.error(f"Error recording passage batch: {e}")
+        # Don't raise - analytics failure shouldn't break gameplay
+        return {
+            "success": False,
+            "recorded": 0,
+            "message": str(e)
+        }
+
+
+@app.get("/api/analytics/buffer")
+async def get_analytics_buffer_stats():
+    """Write-behind buffer depth and flush counters"""
+    if not analytics_service:
+        raise HTTPException(status_code=503, detail="Analytics service unavailable")
+    return {"success": True, "data": analytics_service.buffer_stats()}
+
+
+# The summary is served from memory: rebuilt from Redis at most once per
+# ANALYTICS_SUMMARY_TTL seconds per worker (concurrent requests share one
+# rebuild) and dropped early when analytics are cleared
+ANALYTICS_SUMMARY_TTL = float(os.getenv("ANALYTICS_SUMMARY_TTL", "5"))
+_summary_cache: Dict[str, PreparedJSON] = {}
+_summary_builds: Dict[str, asyncio.Task] = {}
+_summary_generation = 0
+
+
+def _invalidate_summary_cache():
+    global _summary_generation
+    _summary_generation += 1
+    _summary_cache.clear()
+
+
+async def _build_summary(key: str, window: Optional[str]) -> PreparedJSON:
+    generation = _summary_generation
+    summary = await analytics_service.get_summary(window)
+    prepared = PreparedJSON({
+        "success": True,
+        "data": summary,
+        "message": f"Retrieved analytics summary"
+    })
+    # Don't publish a summary computed before a clear
+    if generation == _summary_generation:
+        _summary_cache[key] = prepared
+    return prepared
+
+
+async def _cached_summary(window: Optional[str] = None) -> PreparedJSON:
+    key = window or "all"
+    cached = _summary_cache.get(key)
+    if cached is not None and cached.age() < ANALYTICS_SUMMARY_TTL:
+        return cached
+
+    task = _summary_builds.get(key)
+    if task is None:
+        task = asyncio.create_task(_build_summary(key, window))
+        _summary_builds[key] = task
+        task.add_done_callback(lambda _: _summary_builds.pop(key, None))
+    # Shield so one cancelled request doesn't cancel the shared rebuild
+    return await asyncio.shield(task)
+
+
+# Rollup windows such as 24h (hourly buckets) or 7d (daily buckets)
+WINDOW_PATTERN = r"^\d+[hd]$"
+
+
+@app.get("/api/analytics/aggregation")
+async def get_analytics_aggregation_status():
+    """Aggregation mode and, in worker mode, consumer-group pending count and lag"""
+    if not analytics_service:
+        raise HTTPException(status_code=503, detail="Analytics service unavailable")
+    return {"success": True, "data": await analytics_service.aggregation_status()}
+
+
 @app.get("/api/analytics/summary")
-async def get_analytics_summary():
+async def get_analytics_summary(
+    request: Request,
+    window: Optional[str] = Query(None, pattern=WINDOW_PATTERN),
+):
     """
     Get aggregate analytics statistics for admin dashboard.
     Returns totals, hardest/easiest words, and popular books.
+    Served from a short-lived in-memory cache with an ETag; conditional
+    requests get a 304.
+
+    Args:
+        window: Optional time window (e.g. 24h, 7d) answered from rollups
     """
     if not analytics_service:
         return {
@@ -402,29 +684,42 @@ async def get_analytics_summary():
         }
 
     try:
-        summary = analytics_service.get_summary()
-        return {
-            "success": True,
-            "data": summary,
-            "message": f"Retrieved analytics summary"
-        }
+        summary = await _cached_summary(window)
+        return summary.response(request.headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting analytics summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Stream IDs are "<ms>-<seq>"; a bare millisecond timestamp is also accepted
+STREAM_ID_PATTERN = r"^\d+(-\d+)?$"
+
+
 @app.get("/api/analytics/recent")
-async def get_recent_analytics(count: int = 50):
+async def get_recent_analytics(
+    count: int = 50,
+    cursor: Optional[str] = Query(None, pattern=STREAM_ID_PATTERN),
+    book: Optional[str] = None,
+    level: Optional[int] = None,
+    passed: Optional[bool] = None,
+):
     """
-    Get recent passage attempts for admin review.
+    Get recent passage attempts for admin review, newest first.
 
     Args:
         count: Number of recent entries to retrieve (default: 50, max: 200)
+        cursor: nextCursor from a previous page, to continue further back
+        book: Only passages whose book title contains this text
+        level: Only passages at this level
+        passed: Only passed (true) or failed (false) passages
     """
     if not analytics_service:
         return {
             "success": True,
             "passages": [],
+            "nextCursor": None,
             "message": "Analytics service unavailable"
         }
 
@@ -432,11 +727,14 @@ async def get_recent_analytics(count: int = 50):
     count = min(count, 200)
 
     try:
-        passages = analytics_service.get_recent_passages(count)
+        passages, next_cursor = await analytics_service.get_recent_page(
+            count, cursor=cursor, book=book, level=level, passed=passed
+        )
         return {
             "success": True,
             "passages": passages,
             "count": len(passages),
+            "nextCursor": next_cursor,
             "message": f"Retrieved {len(passages)} recent passages"
         }
     except Exception as e:
@@ -444,11 +742,28 @@ async def get_recent_analytics(count: int = 50):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+EXPORT_PAGE_SIZE = 500
+EXPORT_CSV_COLUMNS = [
+    "entryId", "timestamp", "passageId", "sessionId", "bookTitle", "bookAuthor",
+    "level", "round", "totalBlanks", "correctOnFirstTry", "totalHintsUsed", "passed", "words",
+]
+
+
 @app.get("/api/analytics/export")
-async def export_all_analytics():
+async def export_all_analytics(
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    since: Optional[str] = Query(None, pattern=STREAM_ID_PATTERN),
+    until: Optional[str] = Query(None, pattern=STREAM_ID_PATTERN),
+):
     """
-    Export all analytics data as JSON (admin function).
-    Use for backup or external analysis.
+    Export analytics data for backup or external analysis (admin function).
+    Streams records oldest first, so memory use does not grow with the stream.
+
+    Args:
+        format: json (same shape as before, plus lastId), ndjson or csv;
+            ndjson/csv rows carry the stream entryId
+        since: Exclusive stream ID to start after, for incremental backups
+        until: Inclusive stream ID to stop at
     """
     if not analytics_service:
         return {
@@ -457,24 +772,92 @@ async def export_all_analytics():
             "message": "Analytics service unavailable"
         }
 
+    records = analytics_service.iter_export(since, until, EXPORT_PAGE_SIZE)
+    # Read the first page before committing to a 200 so Redis errors still
+    # surface as a proper error response
     try:
-        all_data = analytics_service.export_all()
-        return {
-            "success": True,
-            "passages": all_data,
-            "count": len(all_data),
-            "message": f"Exported {len(all_data)} passage records"
-        }
+        first = await records.__anext__()
+    except StopAsyncIteration:
+        first = None
     except Exception as e:
         logger.error(f"Error exporting analytics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def all_records():
+        if first is None:
+            return
+        yield first
+        try:
+            async for record in records:
+                yield record
+        except Exception as e:
+            # Headers are already sent; end the stream (truncated) and log
+            logger.error(f"Analytics export aborted mid-stream: {e}")
+
+    filename = f"cloze-analytics-{datetime.utcnow().strftime('%Y-%m-%d')}"
+    if format == "ndjson":
+        return StreamingResponse(
+            _export_ndjson(all_records()),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.ndjson"'},
+        )
+    if format == "csv":
+        return StreamingResponse(
+            _export_csv(all_records()),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+        )
+    return StreamingResponse(_export_json(all_records()), media_type="application/json")
+
+
+async def _export_json(records):
+    count = 0
+    last_id = None
+    yield '{"success":true,"passages":['
+    async for entry_id, record in records:
+        yield ("," if count else "") + json.dumps(record)
+        count += 1
+        last_id = entry_id
+    yield (
+        f'],"count":{count},"lastId":{json.dumps(last_id)},'
+        f'"message":{json.dumps(f"Exported {count} passage records")}}}'
+    )
+
+
+async def _export_ndjson(records):
+    async for entry_id, record in records:
+        yield json.dumps({"entryId": entry_id, **record}) + "\n"
+
+
+async def _export_csv(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    yield flush()
+    async for entry_id, record in records:
+        row = {**record, "entryId": entry_id, "words": json.dumps(record.get("words", []))}
+        writer.writerow([row.get(column, "") for column in EXPORT_CSV_COLUMNS])
+        yield flush()
+
 
 @app.get("/api/analytics/word/{word}")
-async def get_word_statistics(word: str):
+async def get_word_statistics(
+    word: str,
+    window: Optional[str] = Query(None, pattern=WINDOW_PATTERN),
+):
     """
     Get statistics for a specific word.
     Shows how often the word was correct on first try vs needing retries.
+
+    Args:
+        window: Optional time window (e.g. 24h, 7d) answered from rollups
     """
     if not analytics_service:
         return {
@@ -484,17 +867,117 @@ async def get_word_statistics(word: str):
         }
 
     try:
-        stats = analytics_service.get_word_stats(word)
+        stats = await analytics_service.get_word_stats(word, window)
         return {
             "success": True,
             "data": stats,
             "message": f"Retrieved stats for '{word}'"
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting word stats: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Upper bound on words per bulk stats request
+ANALYTICS_MAX_WORDS = 500
+
+
+@app.post("/api/analytics/words")
+async def get_words_statistics(request: WordStatsRequest):
+    """
+    Get first-try/retry counts for a list of words in one request,
+    e.g. to weight candidate blanks by observed difficulty.
+    """
+    if len(request.words) > ANALYTICS_MAX_WORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {ANALYTICS_MAX_WORDS} words per request",
+        )
+    if request.window and not re.fullmatch(WINDOW_PATTERN, request.window):
+        raise HTTPException(status_code=400, detail=f"Invalid window '{request.window}'")
+
+    if not analytics_service:
+        return {
+            "success": True,
+            "data": [
+                {"word": w, "firstTryCount": 0, "retryCount": 0}
+                for w in dict.fromkeys(w.lower() for w in request.words if w)
+            ],
+            "message": "Analytics service unavailable"
+        }
+
+    try:
+        stats = await analytics_service.get_words_stats(request.words, request.window)
+        return {
+            "success": True,
+            "data": stats,
+            "message": f"Retrieved stats for {len(stats)} words"
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting word stats batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/analytics/difficulty")
+async def get_difficulty_ranking(
+    band: str = "all",
+    order: str = Query("hardest", pattern="^(hardest|easiest)$"),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """
+    Words ranked by precomputed difficulty score.
+
+    Args:
+        band: Level band (1-5, 6-10, 11+) or all
+        order: hardest or easiest first
+        limit: Number of words to return
+    """
+    if not analytics_service:
+        return {"success": True, "data": [], "message": "Analytics service unavailable"}
+
+    try:
+        ranking = await analytics_service.get_difficulty_ranking(band, order == "hardest", limit)
+        return {
+            "success": True,
+            "data": ranking,
+            "message": f"Retrieved {len(ranking)} {order} words"
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting difficulty ranking: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/analytics/difficulty/{word}")
+async def get_word_difficulty(word: str):
+    """
+    Difficulty profile for one word: per level band success rate, mean
+    attempts, hint rate, difficulty score and percentile.
+    """
+    if not analytics_service:
+        return {
+            "success": True,
+            "data": {"word": word.lower(), "bands": {}},
+            "message": "Analytics service unavailable"
+        }
+
+    try:
+        difficulty = await analytics_service.get_word_difficulty(word)
+        return {
+            "success": True,
+            "data": difficulty,
+            "message": f"Retrieved difficulty for '{word}'"
+        }
+    except Exception as e:
+        logger.error(f"Error getting word difficulty: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.delete("/api/analytics/clear")
 async def clear_all_analytics():
     """
@@ -505,7 +988,8 @@ async def clear_all_analytics():
         raise HTTPException(status_code=503, detail="Analytics service unavailable")
 
     try:
-        success = analytics_service.clear_analytics()
+        success = await analytics_service.clear_analytics()
+        _invalidate_summary_cache()
         if success:
             return {
                 "success": True,
@@ -518,63 +1002,209 @@ async def clear_all_analytics():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=7860)
-
-
 # ================== HF DATASETS PROXY ENDPOINTS ==================
 
 HF_DATASETS_BASE = "https://datasets-server.huggingface.co"
 
-# very small in-memory cache suitable for single-process app
-_proxy_cache = {
-    "splits": {},  # key -> {value, ts, ttl}
-    "rows": {},
-}
+# Where /api/books/* reads from: "remote" (datasets-server), "local" (ingested
+# corpus only) or "hybrid" (local corpus, falling back to remote on a miss).
+# Populate the corpus with: python book_corpus.py ingest --split en --rows 2000
+BOOKS_SOURCE = os.getenv("BOOKS_SOURCE", "remote").lower()
+_local_corpus = (
+    LocalCorpus(os.getenv("BOOKS_CORPUS_DIR", "data/corpus"))
+    if BOOKS_SOURCE in ("local", "hybrid")
+    else None
+)
+
+# Bounded LRU/TTL cache; random row offsets would otherwise grow it without limit
+_proxy_cache = ProxyCache(
+    limits={
+        "splits": {
+            "max_entries": int(os.getenv("BOOKS_CACHE_SPLITS_MAX_ENTRIES", "64")),
+            "max_bytes": int(os.getenv("BOOKS_CACHE_SPLITS_MAX_BYTES", str(1024 * 1024))),
+        },
+        "rows": {
+            "max_entries": int(os.getenv("BOOKS_CACHE_ROWS_MAX_ENTRIES", "256")),
+            "max_bytes": int(os.getenv("BOOKS_CACHE_ROWS_MAX_BYTES", str(64 * 1024 * 1024))),
+        },
+    },
+    sweep_interval=float(os.getenv("BOOKS_CACHE_SWEEP_INTERVAL", "30")),
+)
 
 
-def _cache_get(bucket: str, key: str):
-    entry = _proxy_cache.get(bucket, {}).get(key)
-    if not entry:
-        return None
-    if time.time() - entry["ts"] > entry["ttl"]:
+def _cache_set(bucket: str, key: str, value, ttl: int, grace: int = 0, size: Optional[int] = None):
+    _proxy_cache.set(bucket, key, value, ttl=ttl, grace=grace, size=size)
+
+
+# in-flight upstream fetches keyed by (bucket, key); concurrent cache misses for
+# the same key await one shared task instead of each hitting datasets-server
+_inflight: dict = {}
+_proxy_stats = {
+    "upstreamFetches": 0,
+    "coalesced": 0,
+    "staleWhileRevalidate": 0,
+    "staleIfError": 0,
+}
+# strong references to fire-and-forget revalidation tasks
+_background_tasks: set = set()
+
+
+async def _fetch_json_shared(
+    bucket: str,
+    key: str,
+    url: str,
+    timeout: float,
+    ttl: int,
+    grace: int = 0,
+    transform: Optional[Callable] = None,
+):
+    """Fetch `url` once per (bucket, key) no matter how many callers miss at once.
+
+    The first caller starts the upstream fetch and caches the result; callers
+    arriving while it is in flight wait on the same task. The task is shielded
+    so a client disconnecting does not cancel the fetch for everyone else.
+    `transform` is applied to the upstream payload before it is cached.
+    """
+    inflight_key = (bucket, key)
+    task = _inflight.get(inflight_key)
+    if task is not None:
+        _proxy_stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _load():
+        _proxy_stats["upstreamFetches"] += 1
+        data, size = await _fetch_json_sized(url, timeout=timeout)
+        if transform is not None:
+            # Projections shrink the payload; let the cache estimate it
+            data, size = transform(data), None
+        _cache_set(bucket, key, data, ttl=ttl, grace=grace, size=size)
+        return data
+
+    def _done(t: asyncio.Task):
+        _inflight.pop(inflight_key, None)
+        # Mark the exception as retrieved even if every waiter went away
+        if not t.cancelled():
+            t.exception()
+
+    task = asyncio.ensure_future(_load())
+    _inflight[inflight_key] = task
+    task.add_done_callback(_done)
+    return await asyncio.shield(task)
+
+
+def _revalidate_in_background(
+    bucket: str, key: str, url: str, timeout: float, ttl: int, grace: int, transform: Optional[Callable]
+):
+    async def _refresh():
         try:
-            del _proxy_cache[bucket][key]
-        except Exception:
-            pass
-        return None
-    return entry["value"]
+            await _fetch_json_shared(
+                bucket, key, url, timeout=timeout, ttl=ttl, grace=grace, transform=transform
+            )
+        except HTTPException as e:
+            logger.warning(f"Background revalidation of {bucket} failed: {e.detail}")
+        except Exception as e:
+            # Transport/decode/transform errors: keep serving the stale entry;
+            # the next stale hit schedules another revalidation
+            logger.warning(f"Background revalidation of {bucket} failed: {type(e).__name__}: {e}")
+
+    task = asyncio.ensure_future(_refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _cached_fetch_json(
+    bucket: str,
+    url: str,
+    timeout: float,
+    ttl: int,
+    stale_while_revalidate: int = 0,
+    stale_if_error: int = 0,
+    key: Optional[str] = None,
+    transform: Optional[Callable] = None,
+):
+    """Serve `url` from cache, falling back to a coalesced upstream fetch.
+
+    With `stale_while_revalidate`, a value up to that many seconds past its TTL
+    is returned immediately while a background refresh runs. With
+    `stale_if_error`, a value up to that many seconds past its TTL is returned
+    when the upstream fetch fails with a 5xx/network error.
+    `key` defaults to `url`; callers that `transform` the payload must pass a
+    key that identifies the transform too.
+    """
+    key = key or url
+    grace = max(stale_while_revalidate, stale_if_error)
+    hit = _proxy_cache.lookup(bucket, key)
+    if hit is not None:
+        value, staleness = hit
+        if staleness <= 0:
+            return value
+        if staleness <= stale_while_revalidate:
+            _proxy_stats["staleWhileRevalidate"] += 1
+            if (bucket, key) not in _inflight:
+                _revalidate_in_background(bucket, key, url, timeout, ttl, grace, transform)
+            return value
 
+    try:
+        return await _fetch_json_shared(
+            bucket, key, url, timeout=timeout, ttl=ttl, grace=grace, transform=transform
+        )
+    except HTTPException as e:
+        if hit is not None and e.status_code >= 500 and hit[1] <= stale_if_error:
+            _proxy_stats["staleIfError"] += 1
+            logger.warning(f"Serving stale {bucket} after upstream error: {e.detail}")
+            return hit[0]
+        raise
 
-def _cache_set(bucket: str, key: str, value, ttl: int):
-    _proxy_cache.setdefault(bucket, {})[key] = {
-        "value": value,
-        "ts": time.time(),
-        "ttl": ttl,
-    }
 
+# One long-lived upstream client per process: keep-alive pooling instead of a
+# fresh TCP+TLS handshake and executor thread per proxied request
+BOOKS_PROXY_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("BOOKS_PROXY_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("BOOKS_PROXY_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("BOOKS_PROXY_KEEPALIVE_EXPIRY", "30")),
+)
+_http_client: Optional[httpx.AsyncClient] = None
 
-def _fetch_sync(url: str, timeout: float = 3.0):
-    req = urllib.request.Request(
-        url,
-        headers={
-            "Accept": "application/json",
-            "User-Agent": "cloze-reader/1.0 (+fastapi-proxy)",
-        },
-    )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        status = resp.getcode()
-        body = resp.read()
-        return status, body
 
+def _http2_enabled() -> bool:
+    """Use HTTP/2 when requested and the optional `h2` package is installed"""
+    if os.getenv("BOOKS_PROXY_HTTP2", "1") != "1":
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=_http2_enabled(),
+            limits=BOOKS_PROXY_LIMITS,
+            headers={
+                "Accept": "application/json",
+                "User-Agent": "cloze-reader/1.0 (+fastapi-proxy)",
+            },
+        )
+    return _http_client
 
-async def _fetch_json(url: str, timeout: float = 3.0):
+
+async def _close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def _fetch_json_sized(url: str, timeout: float = 3.0) -> Tuple[object, int]:
+    """Fetch JSON and return it with the upstream body length (used as its cache size)"""
     try:
-        status, body = await asyncio.to_thread(_fetch_sync, url, timeout)
-        if status != 200:
-            raise HTTPException(status_code=status, detail=f"Upstream returned {status}")
-        return json.loads(body.decode("utf-8"))
+        resp = await _get_http_client().get(url, timeout=timeout)
+        if resp.status_code != 200:
+            raise HTTPException(status_code=resp.status_code, detail=f"Upstream returned {resp.status_code}")
+        return resp.json(), len(resp.content)
     except HTTPException:
         raise
     except Exception as e:
@@ -585,21 +1215,31 @@ async def _fetch_json(url: str, timeout: float = 3.0):
 async def proxy_hf_splits(
     dataset: str = Query(..., description="HF dataset repo id, e.g. manu/project_gutenberg"),
     cache_ttl: int = Query(300, description="Cache TTL seconds (default 300)"),
+    stale_while_revalidate: int = Query(0, ge=0, le=86400, description="Serve expired entries this many seconds past TTL while refreshing in background"),
+    stale_if_error: int = Query(0, ge=0, le=604800, description="Serve expired entries this many seconds past TTL when upstream fails"),
 ):
     """Proxy the HF datasets splits endpoint with caching and timeout.
 
-    Example: /api/books/splits?dataset=manu/project_gutenberg
+    Example: /api/books/splits?dataset=manu/project_gutenberg&stale_while_revalidate=3600
     """
+    if _local_corpus is not None:
+        local = _local_corpus.splits(dataset)
+        if local is not None:
+            return local
+        if BOOKS_SOURCE == "local":
+            raise HTTPException(status_code=404, detail=f"Dataset {dataset} not in local corpus")
+
     dataset_q = urllib.parse.quote(dataset, safe="")
     url = f"{HF_DATASETS_BASE}/splits?dataset={dataset_q}"
 
-    cached = _cache_get("splits", url)
-    if cached is not None:
-        return cached
-
-    data = await _fetch_json(url, timeout=3.0)
-    _cache_set("splits", url, data, ttl=max(1, cache_ttl))
-    return data
+    return await _cached_fetch_json(
+        "splits",
+        url,
+        timeout=3.0,
+        ttl=max(1, cache_ttl),
+        stale_while_revalidate=stale_while_revalidate,
+        stale_if_error=stale_if_error,
+    )
 
 
 @app.get("/api/books/rows")
@@ -610,12 +1250,121 @@ async def proxy_hf_rows(
     offset: int = Query(0, ge=0, le=1000000),
     length: int = Query(1, ge=1, le=50),
     cache_ttl: int = Query(60, description="Cache TTL seconds for identical queries (default 60)"),
+    stale_while_revalidate: int = Query(0, ge=0, le=86400, description="Serve expired entries this many seconds past TTL while refreshing in background"),
+    stale_if_error: int = Query(0, ge=0, le=604800, description="Serve expired entries this many seconds past TTL when upstream fails"),
+    fields: Optional[str] = Query(None, description="Comma-separated row fields to keep, e.g. title,author,text"),
+    text_window: Optional[str] = Query(None, description="Trim text to start:len, or random:len from the middle of the book"),
 ):
     """Proxy the HF datasets rows endpoint with short timeout and small cache.
 
+    `fields` and `text_window` are applied before caching, so the cache holds
+    the trimmed rows. `title`/`author` may be requested even when the dataset
+    lacks them; they are derived from the Gutenberg header before trimming.
+
     Example:
     /api/books/rows?dataset=manu/project_gutenberg&config=default&split=en&offset=0&length=2
+    /api/books/rows?dataset=manu/project_gutenberg&offset=7&fields=id,title,author,text&text_window=random:20000
     """
+    project = _row_projection(fields, text_window)
+
+    def transform(data):
+        # Extract passages from the full rows before they are trimmed
+        _feed_passage_pool(dataset, data)
+        return project(data) if project is not None else data
+
+    suffix = f"#fields={fields or ''}&text_window={text_window or ''}" if project is not None else ""
+    return await _load_rows(
+        dataset,
+        config,
+        split,
+        offset,
+        length,
+        cache_ttl=cache_ttl,
+        stale_while_revalidate=stale_while_revalidate,
+        stale_if_error=stale_if_error,
+        key_suffix=suffix,
+        transform=transform,
+    )
+
+
+MAX_TEXT_WINDOW = 200_000
+
+
+def _row_projection(fields: Optional[str], text_window: Optional[str]) -> Optional[Callable]:
+    """Build a transform that keeps only `fields` and a window of each row's text"""
+    keep = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+    window = None
+    if text_window:
+        start_s, _, length_s = text_window.partition(":")
+        try:
+            window_len = int(length_s)
+            window_start = None if start_s == "random" else int(start_s)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="text_window must be start:len or random:len")
+        if window_len <= 0 or window_len > MAX_TEXT_WINDOW or (window_start is not None and window_start < 0):
+            raise HTTPException(status_code=400, detail=f"text_window length must be 1-{MAX_TEXT_WINDOW}")
+        window = (window_start, window_len)
+
+    if keep is None and window is None:
+        return None
+
+    def project_row(row: dict) -> dict:
+        text = row.get("text") or ""
+        derived = {}
+        if keep is not None and ({"title", "author"} & set(keep)):
+            derived["title"], derived["author"] = extract_metadata(text, row)
+
+        projected = {k: row.get(k, derived.get(k)) for k in keep} if keep is not None else dict(row)
+        if window is not None and "text" in projected:
+            start, length = window
+            if start is None:
+                # Narrative text lives between ~30% and ~80% of a Gutenberg book
+                lo, hi = int(len(text) * 0.3), int(len(text) * 0.8)
+                start = lo + random.randrange(max(1, hi - lo - length))
+            projected["text"] = text[start:start + length]
+        return projected
+
+    def project(data):
+        if not isinstance(data, dict) or not isinstance(data.get("rows"), list):
+            return data
+        rows = []
+        for item in data["rows"]:
+            row = project_row(item.get("row", {}))
+            truncated = ["text"] if window is not None and "text" in row else []
+            rows.append({**item, "row": row, "truncated_cells": truncated})
+        features = data.get("features", [])
+        if keep is not None:
+            features = [f for f in features if f.get("name") in keep]
+        return {**data, "features": features, "rows": rows}
+
+    return project
+
+
+async def _load_rows(
+    dataset: str,
+    config: str,
+    split: str,
+    offset: int,
+    length: int,
+    cache_ttl: int = 60,
+    stale_while_revalidate: int = 0,
+    stale_if_error: int = 0,
+    key_suffix: str = "",
+    transform: Optional[Callable] = None,
+):
+    """Rows slice from the local corpus and/or datasets-server per BOOKS_SOURCE"""
+    if _local_corpus is not None:
+        # mmap page-ins and zlib inflate stay off the event loop. In hybrid
+        # mode a range the local copy only partly holds goes to the source.
+        local = await asyncio.to_thread(
+            _local_corpus.rows, dataset, config, split, offset, length, BOOKS_SOURCE != "local"
+        )
+        if local is not None and (local["rows"] or BOOKS_SOURCE == "local"):
+            return transform(local) if transform is not None else local
+        if BOOKS_SOURCE == "local":
+            raise HTTPException(status_code=404, detail=f"{dataset}/{config}/{split} not in local corpus")
+
     params = {
         "dataset": dataset,
         "config": config,
@@ -626,13 +1375,127 @@ async def proxy_hf_rows(
     qs = urllib.parse.urlencode(params)
     url = f"{HF_DATASETS_BASE}/rows?{qs}"
 
-    cached = _cache_get("rows", url)
-    if cached is not None:
-        return cached
-
     # Allow longer timeout for HF API which can be slow under load
-    # 15s should handle most cases without client-side abort racing
-    data = await _fetch_json(url, timeout=15.0)
+    # 15s should handle most cases without client-side abort racing.
     # Cache briefly to smooth bursts; rows vary by offset so cache is typically small
-    _cache_set("rows", url, data, ttl=max(1, cache_ttl))
-    return data
+    return await _cached_fetch_json(
+        "rows",
+        url,
+        timeout=15.0,
+        ttl=max(1, cache_ttl),
+        stale_while_revalidate=stale_while_revalidate,
+        stale_if_error=stale_if_error,
+        key=url + key_suffix,
+        transform=transform,
+    )
+
+
+@app.get("/api/books/stats")
+async def proxy_stats():
+    """Report upstream fetch, request-coalescing and cache counters for the books proxy."""
+    return {
+        "success": True,
+        "data": {
+            **_proxy_stats,
+            "inFlight": len(_inflight),
+            "cache": _proxy_cache.stats(),
+        },
+    }
+
+
+# ================== PASSAGE POOL ENDPOINTS ==================
+
+# Passages are pre-extracted and quality-scored on the server so a round costs
+# the browser a few hundred bytes instead of a whole book. The pool is seeded
+# from PASSAGE_POOL_FILE (python passage_pool.py build) when present and topped
+# up from book rows in the background.
+PASSAGE_POOL_FILE = os.getenv("PASSAGE_POOL_FILE", "data/passages.jsonl")
+PASSAGE_POOL_DATASET = os.getenv("PASSAGE_POOL_DATASET", "manu/project_gutenberg")
+PASSAGE_POOL_LOW_WATERMARK = int(os.getenv("PASSAGE_POOL_LOW_WATERMARK", "50"))
+PASSAGE_POOL_BATCH = 5
+
+passage_pool = PassagePool(
+    max_size=int(os.getenv("PASSAGE_POOL_MAX_SIZE", "2000")),
+    max_uses=int(os.getenv("PASSAGE_POOL_MAX_USES", "5")),
+)
+_passage_refill_task: Optional[asyncio.Task] = None
+# Rows in the remote split, learned from num_rows_total; refills sample
+# offsets across the whole split rather than just its first rows
+_passage_source_rows: Optional[int] = None
+
+
+def _feed_passage_pool(dataset: str, data) -> None:
+    """Hand rows fetched for players to the pool extractor in the background"""
+    if dataset != PASSAGE_POOL_DATASET or len(passage_pool) >= passage_pool.max_size:
+        return
+    rows = data.get("rows") if isinstance(data, dict) else None
+    if not rows:
+        return
+    task = asyncio.ensure_future(asyncio.to_thread(passage_pool.add_rows, rows))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _fill_passage_pool() -> int:
+    """Pull a batch of rows at a random offset and extract passages from it"""
+    global _passage_source_rows
+    # Until the split size is known, sample the first rows
+    start, num_rows = 0, _passage_source_rows or 1000
+    if _local_corpus is not None:
+        corpus_split = await asyncio.to_thread(_local_corpus.get_split, PASSAGE_POOL_DATASET, "default", "en")
+        if corpus_split is not None and corpus_split.num_rows:
+            start, num_rows = corpus_split.start, corpus_split.num_rows
+    offset = start + random.randrange(max(1, num_rows - PASSAGE_POOL_BATCH))
+    try:
+        data = await _load_rows(PASSAGE_POOL_DATASET, "default", "en", offset, PASSAGE_POOL_BATCH)
+    except HTTPException as e:
+        logger.warning(f"Passage pool refill failed: {e.detail}")
+        return 0
+    if isinstance(data.get("num_rows_total"), int) and data["num_rows_total"] > 0:
+        _passage_source_rows = data["num_rows_total"]
+    return await asyncio.to_thread(passage_pool.add_rows, data.get("rows", []))
+
+
+def _refill_passage_pool() -> asyncio.Task:
+    """Start a refill unless one is already running; returns the running task"""
+    global _passage_refill_task
+    if _passage_refill_task is None or _passage_refill_task.done():
+        _passage_refill_task = asyncio.ensure_future(_fill_passage_pool())
+    return _passage_refill_task
+
+
+@app.get("/api/passages/random")
+async def get_random_passage(level: int = Query(1, ge=1, le=100)):
+    """
+    Serve one pre-extracted, quality-scored passage for a new round.
+    Levels 3+ prefer passages that pass the stricter caps/number thresholds.
+    """
+    passage = passage_pool.random(level)
+    if passage is None:
+        # Cold pool: fill on the critical path once, then serve
+        await asyncio.shield(_refill_passage_pool())
+        passage = passage_pool.random(level)
+    if passage_pool.needs_refill(PASSAGE_POOL_LOW_WATERMARK):
+        _refill_passage_pool()
+    if passage is None:
+        raise HTTPException(status_code=503, detail="No passages available")
+
+    return {
+        "success": True,
+        "passage": {
+            "id": passage["id"],
+            "title": passage["title"],
+            "author": passage["author"],
+            "text": passage["text"],
+        },
+    }
+
+
+@app.get("/api/passages/stats")
+async def get_passage_pool_stats():
+    """Report passage pool size and extraction counters."""
+    return {"success": True, "data": passage_pool.stats()}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=7860)
@@ -0,0 +1,399 @@
+"""
+Book Corpus
+Local on-disk copy of HF dataset rows, served without calling datasets-server
+
+Layout per split: {root}/{dataset}/{config}/{split}/
+    CURRENT        - name of the published version directory
+    v<n>/rows.bin  - zlib-compressed JSON rows, concatenated
+    v<n>/rows.idx  - little-endian uint64 byte offsets into rows.bin (num_rows + 1)
+    v<n>/meta.json - dataset/config/split, source offset, num_rows and
+                     datasets-server style features
+
+A re-ingest writes a new version directory and publishes it by replacing
+CURRENT, so readers always see one complete version.
+
+Usage:
+    python book_corpus.py ingest --dataset manu/project_gutenberg --split en --rows 2000
+    python book_corpus.py ingest --dataset manu/project_gutenberg --split en --file shard-0.jsonl.gz
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HF_DATASETS_BASE = "https://datasets-server.huggingface.co"
+ROWS_PER_PAGE = 100
+_OFFSET = struct.Struct("<Q")
+
+
+def _split_dir(root: str, dataset: str, config: str, split: str) -> str:
+    # "manu/project_gutenberg" -> "manu__project_gutenberg"
+    return os.path.join(root, dataset.replace("/", "__"), config, split)
+
+
+def _published_path(split_path: str) -> Optional[str]:
+    """Directory of the published version of a split, or None if not ingested"""
+    try:
+        with open(os.path.join(split_path, "CURRENT"), "r") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        # Splits ingested before versioning keep their files in place
+        return split_path if os.path.exists(os.path.join(split_path, "meta.json")) else None
+    return os.path.join(split_path, version) if version else None
+
+
+def _infer_features(row: Dict) -> List[Dict]:
+    """Build a datasets-server style feature list from a sample row"""
+    dtypes = {str: "string", int: "int64", float: "float64", bool: "bool"}
+    return [
+        {
+            "feature_idx": idx,
+            "name": name,
+            "type": {"dtype": dtypes.get(type(value), "string"), "_type": "Value"},
+        }
+        for idx, (name, value) in enumerate(row.items())
+    ]
+
+
+class CorpusSplit:
+    """Read-only view of one ingested split, backed by memory-mapped files"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.num_rows = int(self.meta.get("num_rows", 0))
+        # Source offset of the first row, so row_idx matches the remote split
+        self.start = int(self.meta.get("offset", 0))
+
+        self._data_file = open(os.path.join(path, "rows.bin"), "rb")
+        self._idx_file = open(os.path.join(path, "rows.idx"), "rb")
+        self._data = self._mmap(self._data_file)
+        self._idx = self._mmap(self._idx_file)
+
+    @staticmethod
+    def _mmap(f) -> Optional[mmap.mmap]:
+        # mmap refuses zero-length files (an empty split)
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _span(self, i: int) -> Tuple[int, int]:
+        start = _OFFSET.unpack_from(self._idx, i * _OFFSET.size)[0]
+        end = _OFFSET.unpack_from(self._idx, (i + 1) * _OFFSET.size)[0]
+        return start, end
+
+    def row(self, i: int) -> Dict:
+        start, end = self._span(i)
+        return json.loads(zlib.decompress(self._data[start:end]))
+
+    def covers(self, offset: int, length: int) -> bool:
+        """Whether every row of the source range [offset, offset + length) is held locally"""
+        return offset >= self.start and offset + length <= self.start + self.num_rows
+
+    def rows(self, offset: int, length: int) -> Dict:
+        """
+        Slice rows in the same JSON shape as datasets-server /rows.
+        `offset` is in source coordinates; rows outside the ingested range
+        are simply absent.
+        """
+        first = max(offset, self.start)
+        stop = min(offset + length, self.start + self.num_rows)
+        return {
+            "features": self.meta.get("features", []),
+            "rows": [
+                {"row_idx": i, "row": self.row(i - self.start), "truncated_cells": []}
+                for i in range(first, stop)
+            ],
+            "num_rows_total": self.start + self.num_rows,
+            "num_rows_per_page": ROWS_PER_PAGE,
+            "partial": False,
+        }
+
+    def close(self):
+        for m in (self._data, self._idx):
+            if m is not None:
+                m.close()
+        self._data_file.close()
+        self._idx_file.close()
+
+
+class LocalCorpus:
+    """
+    Directory of ingested splits.
+    Splits are opened lazily and stay mapped until a re-ingest publishes a
+    new version, which the next lookup picks up. The superseded mapping is
+    not closed explicitly, since a reader thread may still be using it; it
+    is released once the last reference goes.
+    """
+
+    def __init__(self, root: str):
+        """
+        Initialize Local Corpus
+
+        Args:
+            root: Directory that holds ingested datasets
+        """
+        self.root = root
+        self._splits: Dict[Tuple[str, str, str], CorpusSplit] = {}
+        self._lock = threading.Lock()
+
+    def get_split(self, dataset: str, config: str, split: str) -> Optional[CorpusSplit]:
+        """Return the mapped published split or None if it has not been ingested"""
+        key = (dataset, config, split)
+        # CURRENT is a few bytes; re-reading it is what makes a publish visible
+        path = _published_path(_split_dir(self.root, dataset, config, split))
+        with self._lock:
+            cached = self._splits.get(key)
+            if path is None:
+                self._splits.pop(key, None)
+                return None
+            if cached is None or cached.path != path:
+                try:
+                    self._splits[key] = CorpusSplit(path)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to open local corpus split {key}: {e}")
+                    return cached
+            return self._splits[key]
+
+    def rows(
+        self, dataset: str, config: str, split: str, offset: int, length: int, whole: bool = False
+    ) -> Optional[Dict]:
+        """
+        Serve a rows slice from disk, or None if the split is not available.
+        With `whole`, a range only partly held locally is also None, so the
+        caller can fetch it from the source instead of serving a short page.
+        """
+        corpus_split = self.get_split(dataset, config, split)
+        if corpus_split is None:
+            return None
+        if whole and not corpus_split.covers(offset, length):
+            return None
+        return corpus_split.rows(offset, length)
+
+    def splits(self, dataset: str) -> Optional[Dict]:
+        """List ingested splits in the same JSON shape as datasets-server /splits"""
+        dataset_dir = os.path.join(self.root, dataset.replace("/", "__"))
+        if not os.path.isdir(dataset_dir):
+            return None
+        found = []
+        for config in sorted(os.listdir(dataset_dir)):
+            config_dir = os.path.join(dataset_dir, config)
+            if not os.path.isdir(config_dir):
+                continue
+            for split in sorted(os.listdir(config_dir)):
+                if _published_path(os.path.join(config_dir, split)) is not None:
+                    found.append({"dataset": dataset, "config": config, "split": split})
+        if not found:
+            return None
+        return {"splits": found, "pending": [], "failed": []}
+
+    def close(self):
+        with self._lock:
+            for corpus_split in self._splits.values():
+                corpus_split.close()
+            self._splits.clear()
+
+
+class CorpusWriter:
+    """
+    Writes one split into a new version directory and publishes it on close
+    with a single atomic replace of CURRENT, so a running server never maps a
+    half-written split or mixes files from two versions.
+    """
+
+    def __init__(
+        self, root: str, dataset: str, config: str, split: str, level: int = 6, offset: int = 0
+    ):
+        self.split_path = _split_dir(root, dataset, config, split)
+        self.version = f"v{time.time_ns()}"
+        self.path = os.path.join(self.split_path, self.version)
+        self.dataset = dataset
+        self.config = config
+        self.split = split
+        self.level = level
+        self.offset = offset
+        self.num_rows = 0
+        self.features: List[Dict] = []
+        os.makedirs(self.path)
+        self._data = open(os.path.join(self.path, "rows.bin"), "wb")
+        self._idx = open(os.path.join(self.path, "rows.idx"), "wb")
+        self._offset = 0
+        self._idx.write(_OFFSET.pack(0))
+
+    def add(self, row: Dict):
+        if not self.features:
+            self.features = _infer_features(row)
+        blob = zlib.compress(json.dumps(row, separators=(",", ":")).encode("utf-8"), self.level)
+        self._data.write(blob)
+        self._offset += len(blob)
+        self._idx.write(_OFFSET.pack(self._offset))
+        self.num_rows += 1
+
+    def close(self):
+        self._data.close()
+        self._idx.close()
+        meta = {
+            "dataset": self.dataset,
+            "config": self.config,
+            "split": self.split,
+            "offset": self.offset,
+            "num_rows": self.num_rows,
+            "features": self.features,
+            "ingested_at": datetime.utcnow().isoformat(),
+        }
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        # Publish: the only step readers can observe
+        current_tmp = os.path.join(self.split_path, f"CURRENT.{self.version}.tmp")
+        with open(current_tmp, "w") as f:
+            f.write(self.version)
+        os.replace(current_tmp, os.path.join(self.split_path, "CURRENT"))
+        self._remove_old_versions()
+
+    def _remove_old_versions(self):
+        """
+        Best-effort cleanup of superseded versions and pre-versioning files.
+        Processes that already mapped them keep working (POSIX unlink semantics).
+        """
+        for name in os.listdir(self.split_path):
+            path = os.path.join(self.split_path, name)
+            try:
+                if name.startswith("v") and name != self.version and os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif name in ("rows.bin", "rows.idx", "meta.json"):
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove old corpus files {path}: {e}")
+
+    def abort(self):
+        """Discard the partially written version, leaving the published one in place"""
+        self._data.close()
+        self._idx.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# ===== INGEST SOURCES =====
+
+def iter_remote_rows(
+    dataset: str, config: str, split: str, start: int, count: int, retries: int = 5
+) -> Iterator[Dict]:
+    """Page through datasets-server /rows, backing off on rate limits and 5xx"""
+    with httpx.Client(timeout=30.0, headers={"User-Agent": "cloze-reader/1.0 (+corpus-ingest)"}) as client:
+        offset = start
+        end = start + count
+        while offset < end:
+            length = min(ROWS_PER_PAGE, end - offset)
+            params = {
+                "dataset": dataset,
+                "config": config,
+                "split": split,
+                "offset": offset,
+                "length": length,
+            }
+            for attempt in range(retries):
+                resp = client.get(f"{HF_DATASETS_BASE}/rows", params=params)
+                if resp.status_code == 200:
+                    break
+                if resp.status_code != 429 and resp.status_code < 500:
+                    resp.raise_for_status()
+                delay = 2 ** attempt
+                logger.warning(f"datasets-server returned {resp.status_code}, retrying in {delay}s")
+                time.sleep(delay)
+            else:
+                resp.raise_for_status()
+
+            rows = resp.json().get("rows", [])
+            if not rows:
+                return
+            for item in rows:
+                yield item["row"]
+            offset += len(rows)
+
+
+def iter_file_rows(path: str) -> Iterator[Dict]:
+    """Read rows from a JSONL (optionally .gz) or Parquet shard"""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading parquet shards requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            # Accept both bare rows and datasets-server {"row": {...}} items
+            yield item["row"] if isinstance(item.get("row"), dict) else item
+
+
+def ingest(
+    root: str, dataset: str, config: str, split: str, rows: Iterable[Dict], offset: int = 0
+) -> int:
+    """
+    Write `rows` as the local copy of a split, replacing any previous one.
+    `offset` is the source index of the first row, kept as its row_idx.
+    """
+    with CorpusWriter(root, dataset, config, split, offset=offset) as writer:
+        for row in rows:
+            writer.add(row)
+            if writer.num_rows % 500 == 0:
+                logger.info(f"Ingested {writer.num_rows} rows")
+    logger.info(f"Ingested {writer.num_rows} rows into {writer.path}")
+    return writer.num_rows
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage the local book corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest_cmd = sub.add_parser("ingest", help="Download or import a dataset split")
+    ingest_cmd.add_argument("--root", default=os.getenv("BOOKS_CORPUS_DIR", "data/corpus"))
+    ingest_cmd.add_argument("--dataset", default="manu/project_gutenberg")
+    ingest_cmd.add_argument("--config", default="default")
+    ingest_cmd.add_argument("--split", default="en")
+    ingest_cmd.add_argument("--file", action="append", default=[], help="JSONL(.gz) or Parquet shard; repeatable")
+    ingest_cmd.add_argument("--offset", type=int, default=0, help="Source index of the first row (download start)")
+    ingest_cmd.add_argument("--rows", type=int, default=1000, help="Rows to download when no --file is given")
+    args = parser.parse_args()
+
+    if args.file:
+        source = (row for path in args.file for row in iter_file_rows(path))
+    else:
+        source = iter_remote_rows(args.dataset, args.config, args.split, args.offset, args.rows)
+    ingest(args.root, args.dataset, args.config, args.split, source, offset=args.offset)
+
+
+if __name__ == "__main__":
+    main()
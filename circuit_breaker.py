@@ -0,0 +1,118 @@
+"""
+Circuit Breaker
+Fails fast on a dependency that keeps failing, probing it again after a cool-down
+"""
+
+import logging
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker.
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately; the failure is effectively cached for
+    `reset_timeout` seconds. Then one probe call is let through (half-open):
+    success closes the circuit, failure re-opens it with the timeout doubled,
+    up to `max_reset_timeout`. Every allowed call must end in
+    record_success, record_failure or release, or the probe stays reserved.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 15.0,
+        max_reset_timeout: float = 300.0,
+    ):
+        """
+        Initialize Circuit Breaker
+
+        Args:
+            name: Dependency name used in logs
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe
+            max_reset_timeout: Cap for the timeout after repeated failed probes
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._open_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"opened": 0, "rejected": 0, "failures": 0, "successes": 0}
+        self._last_error: Optional[str] = None
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; reserves the probe when half-open"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self._open_timeout:
+                self._stats["rejected"] += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self._stats["rejected"] += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def release(self) -> None:
+        """Give up a reserved half-open probe without a verdict (e.g. the call was cancelled)"""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        self._stats["successes"] += 1
+        if self.state != self.CLOSED:
+            logger.info(f"{self.name} circuit closed")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._open_timeout = self.reset_timeout
+        self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[str] = None) -> None:
+        self._stats["failures"] += 1
+        self._last_error = error
+        self._failures += 1
+
+        if self.state == self.HALF_OPEN:
+            # Failed probe: stay away longer next time
+            self._open_timeout = min(self._open_timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.state == self.CLOSED and self._failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._stats["opened"] += 1
+        logger.warning(f"{self.name} circuit open for {self._open_timeout:.0f}s: {self._last_error}")
+
+    def stats(self) -> Dict:
+        retry_in = 0.0
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self._open_timeout - (time.monotonic() - self._opened_at))
+        return {
+            **self._stats,
+            "state": self.state,
+            "consecutiveFailures": self._failures,
+            "retryInSeconds": round(retry_in, 1),
+            "lastError": self._last_error,
+        }
@@ -0,0 +1,383 @@
+"""
+HTTP Caching
+Response compression, strong ETags and Cache-Control for static and API responses
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/manifest+json",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+# Static assets are unversioned ES modules, so browsers must revalidate;
+# with strong ETags that costs a 304 rather than the full file
+STATIC_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+ICON_CACHE_CONTROL = "public, max-age=86400"
+PAGE_CACHE_CONTROL = "no-cache"
+API_CACHE_CONTROL = "no-cache"
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br (when available) or gzip from an Accept-Encoding header"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag for an encoded representation: '"abc"' -> '"abc-gzip"'"""
+    if etag.endswith('"'):
+        return f"{etag[:-1]}-{encoding}\""
+    return f"{etag}-{encoding}"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of If-None-Match against `etag`, ignoring encoding suffixes"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def normalize(tag: str) -> str:
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        for suffix in ("-gzip", "-br"):
+            if tag.endswith(suffix):
+                tag = tag[: -len(suffix)]
+        return tag
+
+    target = normalize(etag)
+    return any(normalize(candidate) == target for candidate in if_none_match.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    # Same Vary as the 200 so caches key both responses alike
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"},
+    )
+
+
+_etag_cache: Dict[str, Tuple[int, int, str]] = {}
+
+
+def file_etag(path: str, stat_result: Optional[os.stat_result] = None) -> str:
+    """Strong content-hash ETag, recomputed only when mtime or size change"""
+    stat_result = stat_result or os.stat(path)
+    cached = _etag_cache.get(path)
+    if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    _etag_cache[path] = (stat_result.st_mtime_ns, stat_result.st_size, etag)
+    return etag
+
+
+def cached_file_response(
+    request_headers: Headers,
+    path: str,
+    media_type: Optional[str] = None,
+    cache_control: str = ICON_CACHE_CONTROL,
+) -> Response:
+    """FileResponse with a strong ETag, Cache-Control and If-None-Match 304 handling"""
+    stat_result = os.stat(path)
+    etag = file_etag(path, stat_result)
+    if etag_matches(request_headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control)
+    return FileResponse(
+        path,
+        media_type=media_type,
+        stat_result=stat_result,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with strong content-hash ETags and an explicit Cache-Control"""
+
+    def __init__(self, *args, cache_control: str = STATIC_CACHE_CONTROL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        etag = file_etag(str(full_path), stat_result)
+        if etag_matches(Headers(scope=scope).get("if-none-match"), etag):
+            return not_modified(etag, self.cache_control)
+        return FileResponse(
+            full_path,
+            status_code=status_code,
+            stat_result=stat_result,
+            method=scope["method"],
+            headers={"ETag": etag, "Cache-Control": self.cache_control},
+        )
+
+
+class RenderedPage:
+    """
+    HTML page rendered once into bytes, with gzip/br variants and a strong
+    ETag, so serving it does no disk I/O. At most every `check_interval`
+    seconds a background task checks the file's mtime in the threadpool and
+    re-renders it there when it changed; requests keep getting the previous
+    render until the new one is swapped in.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        render: Optional[Callable[[str], str]] = None,
+        check_interval: float = 2.0,
+    ):
+        self.path = path
+        self.render = render
+        self.check_interval = check_interval
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._variants: Dict[Optional[str], bytes] = {}
+        self.etag = ""
+        self._apply(self._render())
+
+    def _render(self) -> Tuple[Dict[Optional[str], bytes], str, int]:
+        """Read and compress the page (blocking; runs in the threadpool after startup)"""
+        stat_result = os.stat(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            html = f.read()
+        if self.render is not None:
+            html = self.render(html)
+        body = html.encode("utf-8")
+
+        variants = {None: body, "gzip": compress(body, "gzip")}
+        if brotli is not None:
+            variants["br"] = compress(body, "br")
+        logger.info(f"Rendered {self.path} ({len(body)} bytes)")
+        return variants, f'"{hashlib.sha256(body).hexdigest()[:32]}"', stat_result.st_mtime_ns
+
+    def _render_if_changed(self) -> Optional[Tuple[Dict[Optional[str], bytes], str, int]]:
+        if os.stat(self.path).st_mtime_ns == self._mtime_ns:
+            return None
+        return self._render()
+
+    def _apply(self, rendered: Tuple[Dict[Optional[str], bytes], str, int]) -> None:
+        # Swapped on the event loop, so a response never mixes two renders
+        self._variants, self.etag, self._mtime_ns = rendered
+
+    async def _refresh(self) -> None:
+        try:
+            rendered = await run_in_threadpool(self._render_if_changed)
+        except OSError as e:
+            # Keep serving the last good render
+            logger.warning(f"Could not re-render {self.path}: {e}")
+            return
+        if rendered is not None:
+            self._apply(rendered)
+
+    def _refresh_if_changed(self) -> None:
+        if self.check_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._checked_at = now
+        self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+
+    def response(self, request_headers: Headers) -> Response:
+        self._refresh_if_changed()
+        if etag_matches(request_headers.get("if-none-match"), self.etag):
+            return not_modified(self.etag, PAGE_CACHE_CONTROL)
+
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        headers = {"Cache-Control": PAGE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if encoding is not None and encoding in self._variants:
+            headers["Content-Encoding"] = encoding
+            headers["ETag"] = encoded_etag(self.etag, encoding)
+        else:
+            encoding = None
+            headers["ETag"] = self.etag
+        return Response(content=self._variants[encoding], media_type="text/html", headers=headers)
+
+
+class PreparedJSON:
+    """
+    JSON payload serialized once, with a strong ETag, so repeated reads are
+    served from memory and conditional GETs get a 304
+    """
+
+    __slots__ = ("payload", "body", "etag", "created")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        self.created = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    def response(self, request_headers: Headers, cache_control: str = API_CACHE_CONTROL) -> Response:
+        if etag_matches(request_headers.get("if-none-match"), self.etag):
+            return not_modified(self.etag, cache_control)
+        return Response(
+            content=self.body,
+            media_type="application/json",
+            headers={"ETag": self.etag, "Cache-Control": cache_control},
+        )
+
+
+class CompressionMiddleware:
+    """
+    Brotli/gzip response compression above a size threshold.
+    Responses that are already encoded (e.g. pre-compressed pages), too small,
+    or not text-like pass through untouched. Streaming bodies are compressed
+    incrementally, flushing once at least `stream_flush_size` input bytes have
+    accumulated rather than per chunk, so many small chunks (e.g. one export
+    row each) still compress well.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, stream_flush_size: int = 16 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.stream_flush_size = stream_flush_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, self.minimum_size, self.stream_flush_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send: Send, encoding: str, minimum_size: int, stream_flush_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.stream_flush_size = stream_flush_size
+        self._unflushed = 0
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.streaming = False
+        self._compressor = None
+
+    def _eligible(self, headers: Headers) -> bool:
+        if self.start_message["status"] < 200 or self.start_message["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _update_headers(self, length: Optional[int]) -> None:
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "etag" in headers:
+            headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+        if length is None:
+            del headers["content-length"]
+        else:
+            headers["Content-Length"] = str(length)
+
+    def _stream_compressor(self):
+        if self.encoding == "br":
+            c = brotli.Compressor(quality=5)
+            return c.process, c.flush, c.finish
+        c = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.streaming:
+            headers = Headers(raw=self.start_message["headers"])
+            if not self._eligible(headers) or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            if not more_body:
+                compressed = compress(body, self.encoding)
+                self._update_headers(len(compressed))
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            self.streaming = True
+            self._compressor = self._stream_compressor()
+            self._update_headers(None)
+            await self._send(self.start_message)
+
+        process, flush, finish = self._compressor
+        chunk = process(body)
+        self._unflushed += len(body)
+        if not more_body:
+            chunk += finish()
+        elif self._unflushed >= self.stream_flush_size:
+            chunk += flush()
+            self._unflushed = 0
+        if chunk or not more_body:
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,541 @@
+"""
+Passage Pool
+Server-side passage extraction and quality scoring for Project Gutenberg rows
+
+Mirrors the cleaning in bookDataService.js and the passage quality heuristics in
+clozeGameEngine.js so the browser receives a ready-to-play passage instead of a
+whole book.
+
+Usage:
+    python passage_pool.py build --out data/passages.jsonl
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Quality score above which a passage is rejected (clozeGameEngine.js)
+MAX_QUALITY_SCORE = 2.5
+MIN_PASSAGE_LENGTH = 400
+WINDOW_CHARS = 1000
+
+# ===== TEXT CLEANING (bookDataService.js) =====
+
+_START_PATTERNS = [
+    re.compile(r"\*\*\* START OF .*? \*\*\*", re.I),
+    re.compile(r"\*\*\*START OF .*?\*\*\*", re.I),
+    re.compile(r"START OF THE PROJECT GUTENBERG", re.I),
+    re.compile(r"GUTENBERG.*?EBOOK", re.I),
+]
+_END_PATTERNS = [
+    re.compile(r"\*\*\* END OF .*? \*\*\*", re.I),
+    re.compile(r"\*\*\*END OF .*?\*\*\*", re.I),
+    re.compile(r"END OF THE PROJECT GUTENBERG", re.I),
+]
+_ARTIFACTS = [
+    (re.compile(r"produced from images generously.*?\n", re.I), ""),
+    (re.compile(r"^.*page\s+scan\s+source:.*$", re.I | re.M), ""),
+    (re.compile(r"^\s*https?://\S+.*$", re.I | re.M), ""),
+    (re.compile(r"\n\s*\n\s*\n+"), "\n\n"),
+    (re.compile(r"^\s*CHAPTER.*$", re.M), ""),
+    (re.compile(r"^\s*Chapter.*$", re.M), ""),
+    (re.compile(r"^\s*\d+\s*$", re.M), ""),
+    (re.compile(r"^\s*\[.*?\]\s*$", re.M), ""),
+    (re.compile(r"^\s*_.*_\s*$", re.M), ""),
+    (re.compile(r"[_*]"), ""),
+]
+_ALL_CAPS_LINE = re.compile(r"^[^a-z]*[A-Z][A-Z\s'.,:&;-]*$")
+_PUBLISHER_LINE = re.compile(r"(PUBLISHER|PRESS|NEW YORK|LONDON|BOSTON|PARIS|MURRAY STREET|COMPANY|LIMITED)", re.I)
+_FRONT_MATTER_LINE = re.compile(
+    r"(^BY\s+[A-Z .'-]{2,}$|A NOVEL|REVISED AND CORRECTED|COPYRIGHT|Entered according to Act of Congress)", re.I
+)
+_SCAN_LINE = re.compile(r"(archive\.org|Internet Archive|Google|HathiTrust|scann?ed|page\s+scan|https?://|www\.)", re.I)
+_META_MARKERS = ("Title:", "Author:", "Release Date:", "Language:", "Character set", "www.gutenberg", "Project Gutenberg")
+
+
+def clean_gutenberg_text(text: str) -> str:
+    """Strip Project Gutenberg headers, footers, front matter and formatting artifacts"""
+    if not text:
+        return ""
+    cleaned = text
+
+    for pattern in _START_PATTERNS:
+        match = pattern.search(cleaned)
+        if match:
+            next_line = cleaned.find("\n", match.end())
+            if next_line != -1:
+                cleaned = cleaned[next_line + 1:]
+            break
+
+    for pattern in _END_PATTERNS:
+        match = pattern.search(cleaned)
+        if match:
+            cleaned = cleaned[: match.start()]
+            break
+
+    cleaned = cleaned.replace("\r\n", "\n")
+    for pattern, replacement in _ARTIFACTS:
+        cleaned = pattern.sub(replacement, cleaned)
+    cleaned = cleaned.strip()
+
+    # Skip title pages and metadata until the first narrative line
+    lines = cleaned.split("\n")
+    content_start = 0
+    for i, raw in enumerate(lines[:80]):
+        line = raw.strip()
+        if (
+            not line
+            or any(marker in line for marker in _META_MARKERS)
+            or (_ALL_CAPS_LINE.match(line) and len(line) <= 60)
+            or _PUBLISHER_LINE.search(line)
+            or _FRONT_MATTER_LINE.search(line)
+            or _SCAN_LINE.search(line)
+            or len(line) < 20
+        ):
+            content_start = i + 1
+            continue
+        break
+
+    if 0 < content_start < len(lines):
+        cleaned = "\n".join(lines[content_start:]).strip()
+    return cleaned
+
+
+_PG_HEADER = re.compile(r"^.*?The Project Gutenberg EBook of (.+?),\s*by\s+(.+?)$", re.I)
+
+
+def _clean_field(field: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"\[.*?\]", "", field)).strip()
+
+
+def extract_metadata(text: str, row: Optional[Dict] = None) -> Tuple[str, str]:
+    """Title and author from the Gutenberg header, falling back to row fields"""
+    row = row or {}
+    title = row.get("title") or "Classic Literature"
+    author = row.get("author") or "Unknown Author"
+    if not text:
+        return title, author
+
+    first_line = text.split("\n", 1)[0].strip()
+    match = _PG_HEADER.match(first_line)
+    if match:
+        t, a = match.group(1).strip(), match.group(2).strip()
+        if 3 <= len(t) <= 100 and "Project Gutenberg" not in t and "www." not in t:
+            title = _clean_field(t)
+        if 3 <= len(a) <= 50 and "Project Gutenberg" not in a and "www." not in a:
+            author = _clean_field(a)
+        return title, author
+
+    for line in text.split("\n")[:50]:
+        line = line.strip()
+        if line.startswith("Title:") and len(line) > 8:
+            title = _clean_field(line[len("Title:"):])
+        elif line.startswith("Author:") and len(line) > 9:
+            author = _clean_field(line[len("Author:"):])
+    return title, author
+
+
+_INDEX_PATTERNS = [re.compile(p, re.I) for p in ("CONTENTS", "INDEX", "CHAPTER", "Volume", r"Vol\.", "Part I", "Part II", "BOOK I", "APPENDIX")]
+
+
+def is_valid_book(text: str, title: str = "") -> bool:
+    """Book-level checks from bookDataService.isValidForCloze"""
+    length = len(text)
+    if length < 2000 or length > 500000:
+        return False
+    if text.count("\n\n") / length > 0.05:
+        return False
+    if len(re.findall(r"[.!?]+", text)) < 10:
+        return False
+
+    sample = text[:5000]
+    index_count = sum(len(p.findall(sample)) for p in _INDEX_PATTERNS)
+    if index_count / (len(sample.split()) or 1) > 0.05:
+        return False
+
+    lowered = title.lower()
+    return not any(word in lowered for word in ("index", "catalog", "bibliography", "contents"))
+
+
+# ===== PASSAGE QUALITY (clozeGameEngine.js) =====
+
+_FRONT_MATTER = [
+    re.compile(r"(archive\.org|Internet Archive|HathiTrust|Google)", re.I),
+    re.compile(r"page\s+scan\s+source", re.I),
+    re.compile(r"Entered according to Act of Congress", re.I),
+    re.compile(r"COPYRIGHT", re.I),
+    re.compile(r"PUBLISHER|PRESS|MURRAY STREET|NEW YORK|LONDON|BOSTON", re.I),
+    re.compile(r"\bBY\s+[A-Z .'-]{2,}\b"),
+    re.compile(r"\bA NOVEL\b", re.I),
+    re.compile(r"https?://", re.I),
+]
+_ABBREVIATIONS = re.compile(
+    r"\b(n\.|adj\.|adv\.|v\.|pl\.|sg\.|cf\.|e\.g\.|i\.e\.|etc\.|vs\.|viz\.|OE\.|OFr\.|L\.|ME\.|NE\.|AN\.|ON\.|MDu\.|MLG\.|MHG\.|Ger\.|Du\.|Dan\.|Sw\.|Icel\.)\b",
+    re.I,
+)
+_CITATIONS = re.compile(r"\(\d{4}\)|p\.\s*\d+|pp\.\s*\d+-\d+|vol\.\s*\d+|ch\.\s*\d+", re.I)
+_TECHNICAL_TERMS = re.compile(
+    r"etymology|phoneme|morpheme|lexicon|syntax|semantics|glossary|vocabulary|dialect|pronunciation", re.I
+)
+_REPEATED_PHRASES = re.compile(r"CONTENTS|CHAPTER|Volume|Vol\.|Part|Book", re.I)
+
+
+def score_passage(passage: str, strict: bool = False) -> Optional[float]:
+    """
+    Quality score for a candidate passage (lower is better).
+
+    Args:
+        passage: Candidate text
+        strict: Use the tighter caps/number thresholds applied from level 3
+
+    Returns:
+        Score, or None for passages rejected outright (front matter, title pages)
+    """
+    if any(p.search(passage) for p in _FRONT_MATTER):
+        return None
+
+    words = passage.split()
+    total = len(words) or 1
+    lines = [l for l in passage.split("\n") if l.strip()]
+
+    caps = sum(1 for w in words if len(w) > 1 and w == w.upper() and not w.isdigit())
+    numbers = sum(1 for w in words if re.search(r"\d", w))
+    short_words = sum(1 for w in words if len(w) <= 3)
+    punctuation = len(re.findall(r"[;:()\[\]{}—–]", passage))
+    sentences = [s for s in re.split(r"[.!?]+", passage) if len(s.strip()) > 10]
+
+    dash_sequences = len(re.findall(r"[-—–]{3,}", passage))
+    total_dashes = len(re.findall(r"[-—–]", passage))
+    asterisk_marks = len(re.findall(r"\*{3,}", passage)) + len(re.findall(r"^\s*\*+\s*$", passage, re.M))
+    underscore_sequences = len(re.findall(r"_{3,}", passage))
+    equal_sequences = len(re.findall(r"={3,}", passage))
+    pipes = passage.count("|")
+    numbered_lines = len(re.findall(r"^\s*\d+[.)]\s", passage, re.M))
+    parentheses = len(re.findall(r"[()]", passage))
+    square_brackets = len(re.findall(r"[\[\]]", passage))
+
+    hashes = passage.count("#")
+    abbreviations = len(_ABBREVIATIONS.findall(passage))
+    etymology = len(re.findall(r"\[[^\]]+\]", passage))
+    reference_numbers = len(re.findall(r"\b[IVX]+\s+[abc]?\s*\d+", passage))
+    definition_lines = len(re.findall(r"^[^.]+,\s*(n\.|adj\.|adv\.|v\.)", passage, re.M))
+    citations = len(_CITATIONS.findall(passage))
+    technical = len(_TECHNICAL_TERMS.findall(passage))
+    repetition = len(_REPEATED_PHRASES.findall(passage))
+    title_lines = sum(1 for l in lines if re.match(r"^[A-Z][A-Z\s]+$", l.strip()))
+
+    consecutive = max_consecutive = 0
+    for line in lines:
+        trimmed = line.strip()
+        if len(trimmed) > 3 and trimmed == trimmed.upper() and not trimmed.isdigit():
+            consecutive += 1
+            max_consecutive = max(max_consecutive, consecutive)
+        else:
+            consecutive = 0
+
+    caps_ratio = caps / total
+    if caps_ratio > 0.12 or max_consecutive >= 2:
+        return None
+
+    numbers_ratio = numbers / total
+    punctuation_ratio = punctuation / total
+    avg_sentence = total / max(1, len(sentences))
+    dash_ratio = total_dashes / total
+    line_count = max(1, len(lines))
+
+    caps_threshold = 0.03 if strict else 0.05
+    numbers_threshold = 0.02 if strict else 0.03
+
+    score = 0.0
+    if caps_ratio > caps_threshold:
+        score += caps_ratio * 100
+    if numbers_ratio > numbers_threshold:
+        score += numbers_ratio * 40
+    if punctuation_ratio > 0.08:
+        score += punctuation_ratio * 15
+    if avg_sentence < 8 or avg_sentence > 40:
+        score += 2
+    if short_words / total < 0.3:
+        score += 2
+    if repetition / total > 0.02:
+        score += repetition / total * 50
+    if title_lines / line_count > 0.2:
+        score += 5
+    score += dash_sequences * 3
+    if dash_ratio > 0.02:
+        score += dash_ratio * 25
+    score += asterisk_marks * 2 + underscore_sequences * 2 + equal_sequences * 2
+    if pipes > 5:
+        score += 3
+    if numbered_lines > 3:
+        score += 2
+    if parentheses / total > 0.05:
+        score += 2
+    if square_brackets / total > 0.02:
+        score += 2
+    if hashes / total > 0.01:
+        score += hashes / total * 100
+    if abbreviations / total > 0.03:
+        score += abbreviations / total * 50
+    if etymology / total > 0.005:
+        score += etymology / total * 100
+    if definition_lines / line_count > 0.1:
+        score += definition_lines / line_count * 20
+    score += reference_numbers * 2 + citations * 2
+    if technical / total > 0.01:
+        score += technical / total * 30
+    return score
+
+
+_FIRST_SENTENCE = re.compile(r"[.!?]\s+([A-Z][^.!?]*)")
+_FIRST_CAPITAL = re.compile(r"[A-Z][^.!?]*")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def _trim_window(window: str) -> str:
+    """Start at a sentence opening and drop the trailing partial sentence"""
+    match = _FIRST_SENTENCE.search(window)
+    if match and match.start() < 200:
+        window = window[match.start(1):]
+    else:
+        capital = _FIRST_CAPITAL.search(window)
+        if capital:
+            window = window[capital.start():]
+
+    sentences = _SENTENCE_SPLIT.split(window)
+    if len(sentences) > 1:
+        sentences.pop()
+        window = " ".join(sentences)
+    return window
+
+
+def extract_passages(text: str, count: int = 8, rng: Optional[random.Random] = None) -> List[Dict]:
+    """
+    Cut up to `count` candidate windows from the middle of a cleaned book and
+    keep those that pass the quality filter.
+
+    Returns:
+        List of {"text", "score", "strict"} where `strict` means the passage also
+        passes the tighter thresholds used from level 3
+    """
+    rng = rng or random
+    start_bound = int(len(text) * 0.3)
+    end_bound = int(len(text) * 0.8)
+    span = max(0, end_bound - start_bound - WINDOW_CHARS)
+
+    accepted = []
+    for _ in range(count):
+        start = start_bound + (rng.randrange(span) if span > 0 else 0)
+        passage = _trim_window(text[start:start + WINDOW_CHARS])
+        if len(passage) < MIN_PASSAGE_LENGTH:
+            continue
+        score = score_passage(passage)
+        if score is None or score > MAX_QUALITY_SCORE:
+            continue
+        strict_score = score_passage(passage, strict=True)
+        accepted.append({
+            "text": re.sub(r"\s+", " ", passage).strip(),
+            "score": round(score, 3),
+            "strict": strict_score is not None and strict_score <= MAX_QUALITY_SCORE,
+        })
+    return accepted
+
+
+def passages_from_row(row: Dict, per_book: int = 8) -> List[Dict]:
+    """Clean one dataset row and return its accepted passages with book metadata"""
+    raw = row.get("text") or ""
+    title, author = extract_metadata(raw, row)
+    text = clean_gutenberg_text(raw)
+    if not is_valid_book(text, title):
+        return []
+    passages = []
+    for candidate in extract_passages(text, per_book):
+        candidate["id"] = hashlib.sha1(candidate["text"].encode("utf-8")).hexdigest()[:16]
+        candidate["title"] = title
+        candidate["author"] = author
+        passages.append(candidate)
+    return passages
+
+
+class PassagePool:
+    """
+    Bounded pool of accepted passages served to players.
+    A passage is retired after `max_uses` serves (0 keeps it forever) so a
+    small pool does not repeat itself; callers top it up with `add_rows`.
+    Books already scanned are skipped until every passage taken from them
+    has retired, and the oldest scanned books age out past `max_seen_books`,
+    so a long-running pool can draw on the same books again.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 2000,
+        max_uses: int = 5,
+        per_book: int = 8,
+        max_seen_books: int = 5000,
+    ):
+        """
+        Initialize Passage Pool
+
+        Args:
+            max_size: Maximum passages held in memory
+            max_uses: Serves before a passage is retired (0 = unlimited)
+            per_book: Candidate windows tried per book
+            max_seen_books: Scanned books remembered (and skipped) at most
+        """
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.per_book = per_book
+        self._passages: Dict[str, Dict] = {}
+        self._uses: Dict[str, int] = {}
+        self.max_seen_books = max_seen_books
+        # book key -> passages from it still in the pool (LRU, oldest first)
+        self._seen_books: "OrderedDict[str, int]" = OrderedDict()
+        self._passage_books: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats = {"booksScanned": 0, "accepted": 0, "served": 0}
+
+    def __len__(self) -> int:
+        return len(self._passages)
+
+    def needs_refill(self, low_watermark: int) -> bool:
+        return len(self._passages) < low_watermark
+
+    def _add(self, passage: Dict, book_key: Optional[str] = None) -> bool:
+        if len(self._passages) >= self.max_size or passage["id"] in self._passages:
+            return False
+        self._passages[passage["id"]] = passage
+        self._uses[passage["id"]] = 0
+        if book_key is not None and book_key in self._seen_books:
+            self._passage_books[passage["id"]] = book_key
+            self._seen_books[book_key] += 1
+        return True
+
+    def _retire(self, passage_id: str) -> None:
+        del self._passages[passage_id]
+        del self._uses[passage_id]
+        book_key = self._passage_books.pop(passage_id, None)
+        if book_key is not None and book_key in self._seen_books:
+            self._seen_books[book_key] -= 1
+            if self._seen_books[book_key] <= 0:
+                # Everything from this book has been played; it may be scanned again
+                del self._seen_books[book_key]
+
+    def _mark_seen(self, book_key: str) -> None:
+        self._seen_books[book_key] = 0
+        while len(self._seen_books) > self.max_seen_books:
+            self._seen_books.popitem(last=False)
+
+    def add_rows(self, rows: Iterable[Dict]) -> int:
+        """
+        Extract and score passages from dataset rows (bare rows or datasets-server
+        {"row": {...}} items). CPU-bound; run off the event loop.
+
+        Returns:
+            Number of passages added
+        """
+        added = 0
+        for item in rows:
+            row = item.get("row", item) if isinstance(item, dict) else {}
+            raw = row.get("text") or ""
+            book_key = row.get("id") or hashlib.sha1(raw[:2000].encode("utf-8")).hexdigest()
+            with self._lock:
+                if book_key in self._seen_books or len(self._passages) >= self.max_size:
+                    continue
+                self._mark_seen(book_key)
+            passages = passages_from_row(row, self.per_book)
+            with self._lock:
+                self._stats["booksScanned"] += 1
+                for passage in passages:
+                    if self._add(passage, book_key):
+                        self._stats["accepted"] += 1
+                        added += 1
+        return added
+
+    def random(self, level: int = 1) -> Optional[Dict]:
+        """Pick a passage suited to `level` (strict-quality passages from level 3)"""
+        with self._lock:
+            candidates = [
+                p for p in self._passages.values() if level < 3 or p.get("strict")
+            ] or list(self._passages.values())
+            if not candidates:
+                return None
+            passage = random.choice(candidates)
+            self._stats["served"] += 1
+            self._uses[passage["id"]] += 1
+            if self.max_uses and self._uses[passage["id"]] >= self.max_uses:
+                self._retire(passage["id"])
+            return passage
+
+    def load(self, path: str) -> int:
+        """Load a precomputed pool written by `save` / `python passage_pool.py build`"""
+        loaded = 0
+        with open(path, "r", encoding="utf-8") as f:
+            with self._lock:
+                for line in f:
+                    if line.strip() and self._add(json.loads(line)):
+                        loaded += 1
+        logger.info(f"Loaded {loaded} precomputed passages from {path}")
+        return loaded
+
+    def save(self, path: str) -> int:
+        with self._lock:
+            passages = list(self._passages.values())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for passage in passages:
+                f.write(json.dumps(passage) + "\n")
+        os.replace(tmp_path, path)
+        return len(passages)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "size": len(self._passages),
+                "strict": sum(1 for p in self._passages.values() if p.get("strict")),
+                "maxSize": self.max_size,
+                "seenBooks": len(self._seen_books),
+            }
+
+
+def main():
+    from book_corpus import LocalCorpus
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Precompute the passage pool from the local corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Extract passages from an ingested corpus split")
+    build.add_argument("--root", default=os.getenv("BOOKS_CORPUS_DIR", "data/corpus"))
+    build.add_argument("--dataset", default="manu/project_gutenberg")
+    build.add_argument("--config", default="default")
+    build.add_argument("--split", default="en")
+    build.add_argument("--out", default=os.getenv("PASSAGE_POOL_FILE", "data/passages.jsonl"))
+    build.add_argument("--max-size", type=int, default=20000)
+    build.add_argument("--per-book", type=int, default=8)
+    args = parser.parse_args()
+
+    corpus = LocalCorpus(args.root)
+    corpus_split = corpus.get_split(args.dataset, args.config, args.split)
+    if corpus_split is None:
+        raise SystemExit(f"{args.dataset}/{args.config}/{args.split} is not in {args.root}; run book_corpus.py ingest first")
+
+    pool = PassagePool(max_size=args.max_size, max_uses=0, per_book=args.per_book)
+    for i in range(corpus_split.num_rows):
+        pool.add_rows([corpus_split.row(i)])
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    logger.info(f"Wrote {pool.save(args.out)} passages to {args.out}")
+    corpus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Proxy Cache
+Bounded in-memory LRU/TTL cache for the HF datasets proxy
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("value", "ts", "ttl", "grace", "size")
+
+    def __init__(self, value: Any, ts: float, ttl: float, grace: float, size: int):
+        self.value = value
+        self.ts = ts
+        self.ttl = ttl
+        self.grace = grace
+        self.size = size
+
+    def staleness(self, now: float) -> float:
+        """Seconds past the TTL (<= 0 while fresh)"""
+        return now - self.ts - self.ttl
+
+    def expired(self, now: float) -> bool:
+        """Past TTL and past the stale retention window"""
+        return self.staleness(now) > self.grace
+
+
+class ProxyCache:
+    """
+    Bucketed cache with per-bucket entry and byte limits.
+    Each bucket is an LRU (OrderedDict, most recently used last); expired
+    entries are swept proactively every `sweep_interval` seconds on access
+    instead of waiting for someone to read the exact expired key.
+    Entries stored with a `grace` period stay readable through `lookup` for
+    that long after their TTL so callers can serve stale data.
+    """
+
+    DEFAULT_MAX_ENTRIES = 256
+    DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, int]]] = None,
+        sweep_interval: float = 30.0,
+    ):
+        """
+        Initialize Proxy Cache
+
+        Args:
+            limits: Per-bucket limits, e.g. {"rows": {"max_entries": 256, "max_bytes": 64 << 20}}
+            sweep_interval: Minimum seconds between full TTL sweeps
+        """
+        self.limits = limits or {}
+        self.sweep_interval = sweep_interval
+        self._buckets: Dict[str, "OrderedDict[str, _Entry]"] = {}
+        self._bytes: Dict[str, int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._last_sweep = time.monotonic()
+        for bucket in self.limits:
+            self._bucket(bucket)
+
+    def _bucket(self, bucket: str) -> "OrderedDict[str, _Entry]":
+        if bucket not in self._buckets:
+            self._buckets[bucket] = OrderedDict()
+            self._bytes[bucket] = 0
+            self._stats[bucket] = {
+                "hits": 0,
+                "staleHits": 0,
+                "misses": 0,
+                "evictions": 0,
+                "expirations": 0,
+                "rejected": 0,
+            }
+        return self._buckets[bucket]
+
+    def _limit(self, bucket: str, name: str, default: int) -> int:
+        return int(self.limits.get(bucket, {}).get(name, default))
+
+    def _remove(self, bucket: str, key: str) -> None:
+        entry = self._buckets[bucket].pop(key, None)
+        if entry is not None:
+            self._bytes[bucket] -= entry.size
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        """
+        Approximate memory cost, close to the compact JSON length.
+        Walks containers and counts string lengths without serializing, so a
+        multi-MB book text costs a len() rather than a json.dumps on the
+        event loop. Prefer passing `size=` when the upstream byte length is known.
+        """
+        size = 0
+        stack = [value]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                size += len(item) + 2
+            elif isinstance(item, dict):
+                size += 2 + len(item)
+                for k, v in item.items():
+                    size += len(k) + 3 if isinstance(k, str) else 8
+                    stack.append(v)
+            elif isinstance(item, (list, tuple)):
+                size += 2 + len(item)
+                stack.extend(item)
+            else:
+                size += 8
+        return size
+
+    def _maybe_sweep(self, now: float) -> None:
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+    def lookup(self, bucket: str, key: str) -> Optional[Tuple[Any, float]]:
+        """
+        Return (value, staleness) for a retained entry, refreshing its LRU position.
+        Staleness is seconds past the TTL; <= 0 means the value is fresh.
+        """
+        now = time.time()
+        self._maybe_sweep(now)
+        entries = self._bucket(bucket)
+        stats = self._stats[bucket]
+
+        entry = entries.get(key)
+        if entry is None:
+            stats["misses"] += 1
+            return None
+        if entry.expired(now):
+            self._remove(bucket, key)
+            stats["expirations"] += 1
+            stats["misses"] += 1
+            return None
+
+        entries.move_to_end(key)
+        staleness = entry.staleness(now)
+        stats["hits" if staleness <= 0 else "staleHits"] += 1
+        return entry.value, staleness
+
+    def get(self, bucket: str, key: str) -> Optional[Any]:
+        """Return a fresh cached value or None"""
+        hit = self.lookup(bucket, key)
+        if hit is None or hit[1] > 0:
+            return None
+        return hit[0]
+
+    def set(
+        self,
+        bucket: str,
+        key: str,
+        value: Any,
+        ttl: float,
+        grace: float = 0,
+        size: Optional[int] = None,
+    ) -> bool:
+        """
+        Store a value, evicting least recently used entries to stay in budget.
+        `grace` keeps the entry around (as stale) for that many seconds past `ttl`.
+
+        Returns:
+            True if cached, False if the value alone exceeds the bucket byte budget
+        """
+        now = time.time()
+        self._maybe_sweep(now)
+        entries = self._bucket(bucket)
+        stats = self._stats[bucket]
+
+        max_entries = self._limit(bucket, "max_entries", self.DEFAULT_MAX_ENTRIES)
+        max_bytes = self._limit(bucket, "max_bytes", self.DEFAULT_MAX_BYTES)
+        size = self._estimate_size(value) if size is None else size
+
+        self._remove(bucket, key)
+        if size > max_bytes:
+            stats["rejected"] += 1
+            return False
+
+        while entries and (
+            len(entries) >= max_entries or self._bytes[bucket] + size > max_bytes
+        ):
+            oldest_key = next(iter(entries))
+            self._remove(bucket, oldest_key)
+            stats["evictions"] += 1
+
+        entries[key] = _Entry(value, now, ttl, grace, size)
+        self._bytes[bucket] += size
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Drop every expired entry across all buckets.
+
+        Returns:
+            Number of entries removed
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        for bucket, entries in self._buckets.items():
+            expired = [k for k, e in entries.items() if e.expired(now)]
+            for key in expired:
+                self._remove(bucket, key)
+            self._stats[bucket]["expirations"] += len(expired)
+            removed += len(expired)
+        self._last_sweep = time.monotonic()
+        if removed:
+            logger.debug(f"Proxy cache sweep removed {removed} expired entries")
+        return removed
+
+    def clear(self) -> None:
+        """Drop all entries (stats are kept)"""
+        for bucket in self._buckets:
+            self._buckets[bucket].clear()
+            self._bytes[bucket] = 0
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-bucket hit/miss/eviction counters plus current size and limits"""
+        return {
+            bucket: {
+                **self._stats[bucket],
+                "entries": len(entries),
+                "bytes": self._bytes[bucket],
+                "maxEntries": self._limit(bucket, "max_entries", self.DEFAULT_MAX_ENTRIES),
+                "maxBytes": self._limit(bucket, "max_bytes", self.DEFAULT_MAX_BYTES),
+            }
+            for bucket, entries in self._buckets.items()
+        }
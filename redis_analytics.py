@@ -3,21 +3,122 @@ Redis Analytics Service
 Tracks passage attempts, word difficulty, hint usage, and gameplay statistics
 """
 
+import asyncio
 import json
 import os
 import logging
-from datetime import datetime
-from typing import List, Dict, Optional
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
 import redis
+import redis.asyncio as aioredis
 
 logger = logging.getLogger(__name__)
 
 
+# Word difficulty index update for one passage.
+# KEYS: difficulty zset for "all", difficulty zset for the level band, then one
+#       word hash per word
+# ARGV: band, prior weight, prior first-try rate, then per word:
+#       word, first-try (0/1), attempts, hinted (0/1)
+# Each hash keeps {prefix}:n / :first / :attempts / :hinted counters for the
+# band and for "all"; the smoothed difficulty (0 easy .. 1 hard) is written to
+# the matching zset so rank/percentile lookups are O(log n).
+WORD_INDEX_LUA = """
+local band = ARGV[1]
+local prior_n = tonumber(ARGV[2])
+local prior_first = tonumber(ARGV[3])
+
+local function difficulty(hash, prefix)
+  local v = redis.call('HMGET', hash, prefix .. ':n', prefix .. ':first', prefix .. ':attempts', prefix .. ':hinted')
+  local n = tonumber(v[1]) or 0
+  local first = tonumber(v[2]) or 0
+  local attempts = tonumber(v[3]) or 0
+  local hinted = tonumber(v[4]) or 0
+  local miss_rate = 1 - (first + prior_n * prior_first) / (n + prior_n)
+  local extra_attempts = math.min(((attempts + prior_n) / (n + prior_n) - 1) / 3, 1)
+  local hint_rate = hinted / (n + prior_n)
+  return 0.5 * miss_rate + 0.3 * extra_attempts + 0.2 * hint_rate
+end
+
+local k = 3
+for i = 4, #ARGV, 4 do
+  local word, first, attempts, hinted = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2]), ARGV[i + 3]
+  local hash = KEYS[k]
+  for _, prefix in ipairs({band, 'all'}) do
+    redis.call('HINCRBY', hash, prefix .. ':n', 1)
+    redis.call('HINCRBY', hash, prefix .. ':attempts', attempts)
+    if first == '1' then redis.call('HINCRBY', hash, prefix .. ':first', 1) end
+    if hinted == '1' then redis.call('HINCRBY', hash, prefix .. ':hinted', 1) end
+  end
+  redis.call('ZADD', KEYS[2], difficulty(hash, band), word)
+  redis.call('ZADD', KEYS[1], difficulty(hash, 'all'), word)
+  k = k + 1
+end
+return k - 3
+"""
+
+
+def stream_id_time(entry_id: str) -> datetime:
+    """UTC time encoded in a stream entry ID ("<ms>-<seq>")"""
+    return datetime.fromtimestamp(int(entry_id.split("-", 1)[0]) / 1000, timezone.utc)
+
+
+def level_band(level: int) -> str:
+    """Level band used by the word difficulty index"""
+    if level <= 5:
+        return "1-5"
+    if level <= 10:
+        return "6-10"
+    return "11+"
+
+
+class _Rollups:
+    """Hourly and daily rollup writes for one passage, expiring after retention"""
+
+    def __init__(self, service: "RedisAnalyticsService", now: datetime):
+        self.service = service
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=0)
+        # (granularity, bucket start, unix time the bucket key expires)
+        self.buckets = [
+            ("h", hour, int((hour + timedelta(hours=1 + service.ROLLUP_HOURLY_RETENTION)).timestamp())),
+            ("d", day, int((day + timedelta(days=1 + service.ROLLUP_DAILY_RETENTION)).timestamp())),
+        ]
+        self.touched: Dict[str, int] = {}
+
+    def _keys(self, metric: str):
+        for granularity, start, expire_at in self.buckets:
+            key = self.service._rollup_key(metric, granularity, start)
+            self.touched[key] = expire_at
+            yield key
+
+    def zincrby(self, pipe, metric: str, member: str) -> None:
+        for key in self._keys(metric):
+            pipe.zincrby(key, 1, member)
+
+    def incr(self, pipe, metric: str) -> None:
+        for key in self._keys(metric):
+            pipe.incr(key)
+
+    def expire(self, pipe) -> None:
+        for key, expire_at in self.touched.items():
+            pipe.expireat(key, expire_at)
+
+
 class RedisAnalyticsService:
     """
     Service for tracking gameplay analytics using Redis.
     Uses Streams for time-series data and Sorted Sets for aggregates.
+    Redis calls are async (redis.asyncio); call `connect()` once at startup.
+
+    With `write_behind` enabled, passages can be buffered in a bounded
+    in-process queue and flushed to Redis in pipelined batches, by size or
+    every `flush_interval` seconds. A full queue applies backpressure: callers
+    wait up to `enqueue_timeout` and the record is dropped after that. The
+    buffer is drained on `close()`.
     """
 
     # Redis keys
@@ -25,51 +126,164 @@ class RedisAnalyticsService:
     WORDS_FIRST_TRY = "cloze:analytics:words:first_try"
     WORDS_RETRY = "cloze:analytics:words:needed_retry"
     BOOKS_KEY = "cloze:analytics:books"
-    SESSIONS_KEY = "cloze:analytics:sessions"
+    SESSIONS_KEY = "cloze:analytics:sessions"  # legacy SET, migrated to HLL
+    SESSIONS_HLL = "cloze:analytics:sessions:hll"
+    SESSIONS_DAY_PREFIX = "cloze:analytics:sessions:hll:"  # + YYYYMMDD
+
+    SESSION_DAY_RETENTION = 90 * 24 * 3600  # Keep per-day uniques for 90 days
+
+    # Consumer group used by analytics_worker.py in "worker" aggregation mode
+    CONSUMER_GROUP = "cloze:analytics:aggregators"
+
+    # Word difficulty index: one hash per word, one score zset per level band
+    WORD_INDEX_PREFIX = "cloze:analytics:word:"  # + word
+    DIFFICULTY_PREFIX = "cloze:analytics:difficulty:"  # + band or "all"
+    LEVEL_BANDS = ("1-5", "6-10", "11+")
+    # Smoothing: each word starts as if seen DIFFICULTY_PRIOR_WEIGHT times
+    # with this first-try rate, so one unlucky attempt doesn't top the chart
+    DIFFICULTY_PRIOR_WEIGHT = 3
+    DIFFICULTY_PRIOR_FIRST_TRY = 0.7
+
+    # Time-bucketed rollups: {ROLLUP_PREFIX}{metric}:{h|d}:{bucket}
+    # metrics: first_try / retry / books (sorted sets), passages (counter)
+    ROLLUP_PREFIX = "cloze:analytics:rollup:"
+    ROLLUP_HOURLY_RETENTION = 48  # hours; windows up to this use hourly buckets
+    ROLLUP_DAILY_RETENTION = 90  # days
 
     MAX_STREAM_LEN = 10000  # Keep last 10k entries
 
-    def __init__(self, redis_url: Optional[str] = None):
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        session_counting: str = "hll",
+        aggregation: str = "inline",
+        write_behind: bool = False,
+        buffer_size: int = 10000,
+        flush_batch: int = 200,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.5,
+    ):
         """
         Initialize Redis Analytics Service
 
         Args:
             redis_url: Redis connection URL (default: REDIS_URL env var)
+            session_counting: "hll" (HyperLogLog, fixed ~12KB per key, with
+                per-day keys for daily/weekly uniques) or "set" (exact SET)
+            aggregation: "inline" (aggregates written with each passage) or
+                "worker" (requests only XADD; analytics_worker.py applies the
+                aggregates through a consumer group)
+            write_behind: Buffer passages in memory and flush them in batches
+            buffer_size: Maximum passages held in the write-behind queue
+            flush_batch: Passages per pipelined flush (also the size trigger)
+            flush_interval: Maximum seconds a buffered passage waits for a flush
+            enqueue_timeout: Seconds to wait for room in a full queue before dropping
         """
         self.redis_url = redis_url or os.getenv("REDIS_URL")
-        self.redis_client: Optional[redis.Redis] = None
-        self._connect()
+        self.redis_client: Optional[aioredis.Redis] = None
+
+        if session_counting not in ("hll", "set"):
+            raise ValueError(f"Unknown session counting mode: {session_counting}")
+        self.session_counting = session_counting
+
+        if aggregation not in ("inline", "worker"):
+            raise ValueError(f"Unknown aggregation mode: {aggregation}")
+        self.aggregation = aggregation
+
+        self.write_behind = write_behind
+        self.buffer_size = buffer_size
+        self.flush_batch = flush_batch
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        # Queue/event/task are created in connect() so they bind to the running loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._buffer_stats = {"queued": 0, "flushed": 0, "batches": 0, "dropped": 0, "failed": 0}
+
+    async def connect(self, pool: Optional[aioredis.ConnectionPool] = None):
+        """
+        Establish Redis connection
 
-    def _connect(self):
-        """Establish Redis connection"""
-        if not self.redis_url:
+        Args:
+            pool: Shared connection pool; a private client is created from
+                redis_url when omitted
+        """
+        if pool is None and not self.redis_url:
             logger.warning("No REDIS_URL provided for analytics")
             return
 
         try:
-            self.redis_client = redis.from_url(
-                self.redis_url,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-            )
-            self.redis_client.ping()
+            if pool is not None:
+                self.redis_client = aioredis.Redis(connection_pool=pool)
+            else:
+                self.redis_client = aioredis.from_url(
+                    self.redis_url,
+                    decode_responses=True,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                )
+            await self.redis_client.ping()
             logger.info("Redis Analytics Service connected")
         except redis.RedisError as e:
             logger.error(f"Failed to connect Redis for analytics: {e}")
             self.redis_client = None
+            return
 
-    def is_available(self) -> bool:
+        if self.session_counting == "hll":
+            await self._migrate_sessions_to_hll()
+
+        if self.aggregation == "worker":
+            # Create the group up front so entries added before the first
+            # worker starts are still delivered to it
+            try:
+                await self.ensure_consumer_group("$")
+            except redis.RedisError as e:
+                logger.error(f"Failed to create analytics consumer group: {e}")
+
+        if self.write_behind:
+            self._queue = asyncio.Queue(maxsize=self.buffer_size)
+            self._wake = asyncio.Event()
+            self._stopping = False
+            self._flusher = asyncio.create_task(self._flush_loop())
+            logger.info(
+                f"Analytics write-behind enabled (buffer {self.buffer_size}, "
+                f"batch {self.flush_batch}, interval {self.flush_interval}s)"
+            )
+
+    async def close(self):
+        """Flush buffered passages and release the Redis client (a shared pool is left to its owner)"""
+        if self._flusher is not None:
+            self._stopping = True
+            self._wake.set()
+            await self._flusher
+            self._flusher = None
+        if self.redis_client:
+            await self.redis_client.aclose()
+            self.redis_client = None
+
+    @property
+    def connected(self) -> bool:
+        """Whether connect() succeeded; unlike is_available() this costs no round trip"""
+        return self.redis_client is not None
+
+    @property
+    def buffering(self) -> bool:
+        """Whether passages should go through enqueue_passage()"""
+        return self._flusher is not None and not self._stopping
+
+    async def is_available(self) -> bool:
         """Check if Redis is available for analytics"""
         if not self.redis_client:
             return False
         try:
-            self.redis_client.ping()
+            await self.redis_client.ping()
             return True
         except redis.RedisError:
             return False
 
-    def record_passage(self, data: Dict) -> Optional[str]:
+    async def record_passage(self, data: Dict) -> Optional[str]:
         """
         Record a completed passage attempt with summary data.
 
@@ -95,112 +309,556 @@ class RedisAnalyticsService:
             return None
 
         try:
-            # Add timestamp if not present
-            if "timestamp" not in data:
-                data["timestamp"] = datetime.utcnow().isoformat()
+            # One MULTI/EXEC round trip: stream entry plus every aggregate
+            pipe = self.redis_client.pipeline(transaction=True)
+            self._queue_passage(pipe, data)
+            results = await pipe.execute()
+            entry_id = results[0]
 
-            # Add to stream (time-series)
-            entry_id = self.redis_client.xadd(
-                self.STREAM_KEY,
-                {"data": json.dumps(data)},
-                maxlen=self.MAX_STREAM_LEN,
-                approximate=True,
+            logger.debug(f"Recorded passage analytics: {entry_id}")
+            return entry_id
+
+        except redis.RedisError as e:
+            logger.error(f"Failed to record passage analytics: {e}")
+            return None
+
+    async def record_passages(self, items: List[Dict]) -> List[Optional[str]]:
+        """
+        Record many passages in a single pipelined round trip.
+
+        Args:
+            items: Passage analytics dicts, as for record_passage
+
+        Returns:
+            Stream entry IDs in input order (all None if the batch failed)
+        """
+        if not items:
+            return []
+        if not self.redis_client:
+            logger.warning("Analytics unavailable - Redis not connected")
+            return [None] * len(items)
+
+        try:
+            # Plain pipeline rather than MULTI: one round trip without holding
+            # Redis in a single large EXEC for the whole batch
+            pipe = self.redis_client.pipeline(transaction=False)
+            xadd_positions = []
+            for data in items:
+                xadd_positions.append(len(pipe))
+                self._queue_passage(pipe, data)
+            results = await pipe.execute()
+
+            logger.debug(f"Recorded {len(items)} passages in one batch")
+            return [results[i] for i in xadd_positions]
+
+        except redis.RedisError as e:
+            logger.error(f"Failed to record passage batch: {e}")
+            return [None] * len(items)
+
+    def _queue_passage(self, pipe, data: Dict) -> None:
+        """Queue the stream entry (and, inline, the aggregate updates) for one passage on `pipe`"""
+        # Add timestamp if not present
+        if "timestamp" not in data:
+            data["timestamp"] = datetime.utcnow().isoformat()
+
+        # Add to stream (time-series)
+        pipe.xadd(
+            self.STREAM_KEY,
+            {"data": json.dumps(data)},
+            maxlen=self.MAX_STREAM_LEN,
+            approximate=True,
+        )
+
+        if self.aggregation == "inline":
+            self._queue_aggregates(pipe, data, datetime.now(timezone.utc))
+
+    def _queue_aggregates(self, pipe, data: Dict, at: datetime) -> None:
+        """Queue word/book/session/rollup updates for one passage recorded at `at`"""
+        rollups = _Rollups(self, at)
+
+        # Update word difficulty stats
+        index_keys: List[str] = []
+        index_args: List = []
+        for word_data in data.get("words", []):
+            word = word_data.get("word", "").lower()
+            if not word:
+                continue
+
+            attempts = word_data.get("attemptsToCorrect", 1)
+            first_try = attempts == 1 and word_data.get("finalCorrect", False)
+            if first_try:
+                # Word was correct on first try
+                pipe.zincrby(self.WORDS_FIRST_TRY, 1, word)
+                rollups.zincrby(pipe, "first_try", word)
+            elif attempts > 1:
+                # Word needed retry(s)
+                pipe.zincrby(self.WORDS_RETRY, 1, word)
+                rollups.zincrby(pipe, "retry", word)
+
+            index_keys.append(f"{self.WORD_INDEX_PREFIX}{word}")
+            index_args += [word, int(first_try), max(int(attempts or 1), 1), int(bool(word_data.get("hintsUsed")))]
+
+        if index_keys:
+            band = level_band(int(data.get("level") or 1))
+            # EVAL rather than EVALSHA: no NOSCRIPT handling or SCRIPT EXISTS
+            # round trip inside the pipeline; Redis caches the compiled script
+            pipe.eval(
+                WORD_INDEX_LUA,
+                2 + len(index_keys),
+                f"{self.DIFFICULTY_PREFIX}all",
+                f"{self.DIFFICULTY_PREFIX}{band}",
+                *index_keys,
+                band,
+                self.DIFFICULTY_PRIOR_WEIGHT,
+                self.DIFFICULTY_PRIOR_FIRST_TRY,
+                *index_args,
             )
 
-            # Update word difficulty stats
-            for word_data in data.get("words", []):
-                word = word_data.get("word", "").lower()
-                if not word:
-                    continue
+        # Update book usage counter
+        book_key = f"{data.get('bookTitle', 'Unknown')}|{data.get('bookAuthor', 'Unknown')}"
+        pipe.zincrby(self.BOOKS_KEY, 1, book_key)
+        rollups.zincrby(pipe, "books", book_key)
+        rollups.incr(pipe, "passages")
+        rollups.expire(pipe)
 
-                attempts = word_data.get("attemptsToCorrect", 1)
-                if attempts == 1 and word_data.get("finalCorrect", False):
-                    # Word was correct on first try
-                    self.redis_client.zincrby(self.WORDS_FIRST_TRY, 1, word)
-                elif attempts > 1:
-                    # Word needed retry(s)
-                    self.redis_client.zincrby(self.WORDS_RETRY, 1, word)
+        # Track session
+        session_id = data.get("sessionId", "unknown")
+        if self.session_counting == "hll":
+            day_key = self._session_day_key(at)
+            pipe.pfadd(self.SESSIONS_HLL, session_id)
+            pipe.pfadd(day_key, session_id)
+            pipe.expire(day_key, self.SESSION_DAY_RETENTION)
+        else:
+            pipe.sadd(self.SESSIONS_KEY, session_id)
 
-            # Update book usage counter
-            book_key = f"{data.get('bookTitle', 'Unknown')}|{data.get('bookAuthor', 'Unknown')}"
-            self.redis_client.zincrby(self.BOOKS_KEY, 1, book_key)
+    # ===== CONSUMER-GROUP AGGREGATION =====
 
-            # Track session
-            session_id = data.get("sessionId", "unknown")
-            self.redis_client.sadd(self.SESSIONS_KEY, session_id)
+    async def ensure_consumer_group(self, start_id: str = "$") -> bool:
+        """
+        Create the aggregation consumer group if it does not exist.
 
-            logger.debug(f"Recorded passage analytics: {entry_id}")
-            return entry_id
+        Args:
+            start_id: "$" to aggregate only new entries, "0" to replay the
+                retained stream (e.g. to build a new aggregate)
+
+        Returns:
+            True if the group was created, False if it already existed
+        """
+        try:
+            await self.redis_client.xgroup_create(
+                self.STREAM_KEY, self.CONSUMER_GROUP, id=start_id, mkstream=True
+            )
+            return True
+        except redis.ResponseError as e:
+            if "BUSYGROUP" in str(e):
+                return False
+            raise
 
+    async def apply_stream_entries(self, entries: List[Tuple[str, Optional[Dict]]], group: Optional[str] = None) -> int:
+        """
+        Apply aggregates for stream entries and acknowledge them in the same
+        MULTI/EXEC, so an entry is never counted without being acked.
+        Entries with no data (trimmed from the stream, or malformed) are acked
+        and skipped.
+
+        Returns:
+            Number of entries aggregated
+        """
+        if not entries:
+            return 0
+        pipe = self.redis_client.pipeline(transaction=True)
+        applied = 0
+        for entry_id, fields in entries:
+            if not fields or "data" not in fields:
+                continue
+            try:
+                data = json.loads(fields["data"])
+            except ValueError:
+                logger.warning(f"Skipping malformed analytics entry {entry_id}")
+                continue
+            self._queue_aggregates(pipe, data, stream_id_time(entry_id))
+            applied += 1
+        if group:
+            pipe.xack(self.STREAM_KEY, group, *[entry_id for entry_id, _ in entries])
+        await pipe.execute()
+        return applied
+
+    async def aggregation_status(self) -> Dict:
+        """Aggregation mode plus consumer-group pending count, lag and consumers"""
+        status = {"mode": self.aggregation, "group": None}
+        if not self.redis_client or self.aggregation != "worker":
+            return status
+        try:
+            for group in await self.redis_client.xinfo_groups(self.STREAM_KEY):
+                if group.get("name") == self.CONSUMER_GROUP:
+                    status["group"] = {
+                        "consumers": group.get("consumers"),
+                        "pending": group.get("pending"),
+                        # Entries not yet delivered to any consumer (Redis 7+)
+                        "lag": group.get("lag"),
+                        "lastDeliveredId": group.get("last-delivered-id"),
+                    }
         except redis.RedisError as e:
-            logger.error(f"Failed to record passage analytics: {e}")
-            return None
+            logger.error(f"Failed to read consumer group status: {e}")
+        return status
+
+    # ===== TIME-BUCKETED ROLLUPS =====
+
+    def _rollup_key(self, metric: str, granularity: str, t: datetime) -> str:
+        bucket = t.strftime("%Y%m%d%H" if granularity == "h" else "%Y%m%d")
+        return f"{self.ROLLUP_PREFIX}{metric}:{granularity}:{bucket}"
+
+    def parse_window(self, window: str) -> Tuple[str, int]:
+        """
+        Parse "24h" / "7d" into (granularity, bucket count).
+
+        Raises:
+            ValueError: for malformed windows or ones longer than the retention
+        """
+        match = re.fullmatch(r"(\d+)([hd])", window or "")
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Invalid window '{window}', expected e.g. 24h or 7d")
+        count, unit = int(match.group(1)), match.group(2)
+        if unit == "h" and count > self.ROLLUP_HOURLY_RETENTION:
+            raise ValueError(f"Hourly windows are limited to {self.ROLLUP_HOURLY_RETENTION}h")
+        if unit == "d" and count > self.ROLLUP_DAILY_RETENTION:
+            raise ValueError(f"Daily windows are limited to {self.ROLLUP_DAILY_RETENTION}d")
+        return unit, count
+
+    def _window_keys(self, metric: str, window: str) -> List[str]:
+        """Bucket keys covering `window`, ending with the current bucket"""
+        granularity, count = self.parse_window(window)
+        step = timedelta(hours=1) if granularity == "h" else timedelta(days=1)
+        now = datetime.now(timezone.utc)
+        return [self._rollup_key(metric, granularity, now - i * step) for i in range(count)]
+
+    def _window_day_count(self, window: str) -> int:
+        """Whole UTC days touched by `window` (for per-day session HLLs)"""
+        granularity, count = self.parse_window(window)
+        if granularity == "d":
+            return count
+        now = datetime.now(timezone.utc)
+        return (now.date() - (now - timedelta(hours=count - 1)).date()).days + 1
+
+    # ===== WORD DIFFICULTY INDEX =====
+
+    def _validate_band(self, band: str) -> None:
+        if band != "all" and band not in self.LEVEL_BANDS:
+            raise ValueError(f"Unknown level band '{band}', expected all or one of {', '.join(self.LEVEL_BANDS)}")
+
+    async def get_word_difficulty(self, word: str) -> Dict:
+        """
+        Per-band success rates, mean attempts, hint rate, difficulty score
+        and percentile for one word (higher percentile = harder than more words).
+        """
+        word = word.lower()
+        result = {"word": word, "bands": {}}
+        if not self.redis_client:
+            return result
+
+        bands = ("all",) + self.LEVEL_BANDS
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hgetall(f"{self.WORD_INDEX_PREFIX}{word}")
+            for band in bands:
+                key = f"{self.DIFFICULTY_PREFIX}{band}"
+                pipe.zscore(key, word)
+                pipe.zrank(key, word)
+                pipe.zcard(key)
+            results = await pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Failed to get word difficulty: {e}")
+            return result
+
+        counters = results[0]
+        for i, band in enumerate(bands):
+            score, rank, card = results[1 + 3 * i: 4 + 3 * i]
+            n = int(counters.get(f"{band}:n", 0))
+            if not n or score is None:
+                continue
+            result["bands"][band] = {
+                "observations": n,
+                "firstTryRate": round(int(counters.get(f"{band}:first", 0)) / n, 4),
+                "meanAttempts": round(int(counters.get(f"{band}:attempts", 0)) / n, 4),
+                "hintRate": round(int(counters.get(f"{band}:hinted", 0)) / n, 4),
+                "difficulty": round(float(score), 4),
+                "percentile": round(100.0 * rank / (card - 1), 1) if card > 1 else 50.0,
+            }
+        return result
+
+    async def get_difficulty_ranking(self, band: str = "all", hardest: bool = True, limit: int = 20) -> List[Dict]:
+        """
+        Hardest (or easiest) words by precomputed difficulty within a band.
+
+        Raises:
+            ValueError: for an unknown band
+        """
+        self._validate_band(band)
+        if not self.redis_client:
+            return []
+
+        key = f"{self.DIFFICULTY_PREFIX}{band}"
+        try:
+            if hardest:
+                ranked = await self.redis_client.zrevrange(key, 0, limit - 1, withscores=True)
+            else:
+                ranked = await self.redis_client.zrange(key, 0, limit - 1, withscores=True)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for word, _ in ranked:
+                pipe.hget(f"{self.WORD_INDEX_PREFIX}{word}", f"{band}:n")
+            observations = await pipe.execute() if ranked else []
+        except redis.RedisError as e:
+            logger.error(f"Failed to get difficulty ranking: {e}")
+            return []
+
+        return [
+            {"word": word, "difficulty": round(float(score), 4), "observations": int(n or 0)}
+            for (word, score), n in zip(ranked, observations)
+        ]
+
+    # ===== UNIQUE SESSIONS =====
+
+    def _session_day_key(self, day: datetime) -> str:
+        return f"{self.SESSIONS_DAY_PREFIX}{day.strftime('%Y%m%d')}"
+
+    async def _migrate_sessions_to_hll(self):
+        """
+        One-time migration of the legacy sessions SET into the all-time HLL.
+        PFADD is idempotent, so workers racing through this at startup is harmless;
+        the SET is deleted afterwards so later starts skip it.
+        """
+        try:
+            if not await self.redis_client.exists(self.SESSIONS_KEY):
+                return
+            migrated = 0
+            batch = []
+            async for session_id in self.redis_client.sscan_iter(self.SESSIONS_KEY, count=1000):
+                batch.append(session_id)
+                if len(batch) >= 1000:
+                    await self.redis_client.pfadd(self.SESSIONS_HLL, *batch)
+                    migrated += len(batch)
+                    batch = []
+            if batch:
+                await self.redis_client.pfadd(self.SESSIONS_HLL, *batch)
+                migrated += len(batch)
+            await self.redis_client.delete(self.SESSIONS_KEY)
+            logger.info(f"Migrated {migrated} sessions from SET to HyperLogLog")
+        except redis.RedisError as e:
+            logger.error(f"Failed to migrate sessions to HyperLogLog: {e}")
+
+    async def _session_counts(self) -> Dict[str, int]:
+        """Unique sessions all-time, today and over the last 7 days (UTC)"""
+        if self.session_counting != "hll":
+            return {"totalSessions": await self.redis_client.scard(self.SESSIONS_KEY)}
+
+        today = datetime.utcnow()
+        week_keys = [self._session_day_key(today - timedelta(days=i)) for i in range(7)]
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.pfcount(self.SESSIONS_HLL)
+        pipe.pfcount(week_keys[0])
+        # PFCOUNT over several keys is the cardinality of their union
+        pipe.pfcount(*week_keys)
+        total, daily, weekly = await pipe.execute()
+        return {"totalSessions": total, "dailySessions": daily, "weeklySessions": weekly}
+
+    # ===== WRITE-BEHIND BUFFER =====
+
+    async def enqueue_passage(self, data: Dict) -> bool:
+        """
+        Buffer a passage for the next batched flush.
+
+        Returns:
+            True if queued, False if the buffer stayed full for enqueue_timeout
+        """
+        if not self.buffering:
+            return await self.record_passage(data) is not None
+
+        # Stamp now so the record reflects play time, not flush time
+        if "timestamp" not in data:
+            data["timestamp"] = datetime.utcnow().isoformat()
+
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(data), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self._buffer_stats["dropped"] += 1
+                logger.warning("Analytics buffer full, dropping passage")
+                return False
+
+        self._buffer_stats["queued"] += 1
+        if self._queue.qsize() >= self.flush_batch:
+            self._wake.set()
+        return True
+
+    async def _flush_loop(self):
+        """Flush the buffer when it reaches flush_batch or every flush_interval"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            while not self._queue.empty():
+                batch = []
+                while len(batch) < self.flush_batch and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                await self._flush(batch)
+
+            if self._stopping:
+                return
+
+    async def _flush(self, batch: List[Dict]) -> None:
+        try:
+            entry_ids = await self.record_passages(batch)
+        except Exception as e:
+            logger.error(f"Analytics flush failed: {e}")
+            entry_ids = [None] * len(batch)
+        written = sum(1 for entry_id in entry_ids if entry_id)
+        self._buffer_stats["batches"] += 1
+        self._buffer_stats["flushed"] += written
+        # Failed batches are dropped rather than retried, so an outage can't
+        # back the buffer up indefinitely
+        self._buffer_stats["failed"] += len(batch) - written
+
+    def buffer_stats(self) -> Dict:
+        """Write-behind counters and current queue depth"""
+        return {
+            **self._buffer_stats,
+            "enabled": self.buffering,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "capacity": self.buffer_size,
+            "flushBatch": self.flush_batch,
+            "flushInterval": self.flush_interval,
+        }
 
-    def get_summary(self) -> Dict:
+    async def get_summary(self, window: Optional[str] = None) -> Dict:
         """
         Get aggregate statistics for admin dashboard.
 
+        Args:
+            window: Optional time window such as "24h" or "7d", answered from
+                the hourly/daily rollups instead of the all-time sets
+
         Returns:
             Dictionary with:
                 - totalPassages: Total recorded passages
                 - totalSessions: Unique sessions
+                - dailySessions / weeklySessions: Unique sessions today and over
+                  the last 7 days (UTC; HLL mode only)
                 - hardestWords: Top 10 words needing retries
                 - easiestWords: Top 10 words correct on first try
                 - popularBooks: Top 10 most used books
+
+        Raises:
+            ValueError: for an invalid window
         """
+        if window:
+            self.parse_window(window)
         if not self.redis_client:
             return self._empty_summary()
 
         try:
+            if window:
+                return await self._window_summary(window)
+
             # Get stream length
-            total_passages = self.redis_client.xlen(self.STREAM_KEY)
+            total_passages = await self.redis_client.xlen(self.STREAM_KEY)
 
-            # Get unique sessions count
-            total_sessions = self.redis_client.scard(self.SESSIONS_KEY)
+            # Get unique sessions counts
+            session_counts = await self._session_counts()
 
             # Get hardest words (most retries needed)
-            hardest_raw = self.redis_client.zrevrange(
+            hardest_raw = await self.redis_client.zrevrange(
                 self.WORDS_RETRY, 0, 9, withscores=True
             )
-            hardest_words = [
-                {"word": word, "retryCount": int(score)}
-                for word, score in hardest_raw
-            ]
 
             # Get easiest words (most first-try successes)
-            easiest_raw = self.redis_client.zrevrange(
+            easiest_raw = await self.redis_client.zrevrange(
                 self.WORDS_FIRST_TRY, 0, 9, withscores=True
             )
-            easiest_words = [
-                {"word": word, "firstTryCount": int(score)}
-                for word, score in easiest_raw
-            ]
 
             # Get popular books
-            books_raw = self.redis_client.zrevrange(
+            books_raw = await self.redis_client.zrevrange(
                 self.BOOKS_KEY, 0, 9, withscores=True
             )
-            popular_books = []
-            for book_key, count in books_raw:
-                parts = book_key.split("|", 1)
-                popular_books.append({
-                    "title": parts[0] if parts else "Unknown",
-                    "author": parts[1] if len(parts) > 1 else "Unknown",
-                    "usageCount": int(count),
-                })
 
-            return {
-                "totalPassages": total_passages,
-                "totalSessions": total_sessions,
-                "hardestWords": hardest_words,
-                "easiestWords": easiest_words,
-                "popularBooks": popular_books,
-            }
+            return self._format_summary(
+                total_passages, session_counts, hardest_raw, easiest_raw, books_raw
+            )
 
         except redis.RedisError as e:
             logger.error(f"Failed to get analytics summary: {e}")
             return self._empty_summary()
 
+    async def _window_summary(self, window: str) -> Dict:
+        """Summary over a time window, merging rollup buckets with ZUNIONSTORE"""
+        # One round trip: union each metric's buckets into a short-lived key,
+        # read the top 10 and drop the key again
+        pipe = self.redis_client.pipeline(transaction=False)
+        temp_keys = []
+        for metric in ("retry", "first_try", "books"):
+            temp_key = f"{self.ROLLUP_PREFIX}tmp:{uuid.uuid4().hex}"
+            temp_keys.append(temp_key)
+            pipe.zunionstore(temp_key, self._window_keys(metric, window))
+            # Safety net in case the DELETE below never runs
+            pipe.expire(temp_key, 60)
+            pipe.zrevrange(temp_key, 0, 9, withscores=True)
+        pipe.mget(self._window_keys("passages", window))
+        if self.session_counting == "hll":
+            now = datetime.utcnow()
+            day_keys = [
+                self._session_day_key(now - timedelta(days=i))
+                for i in range(self._window_day_count(window))
+            ]
+            pipe.pfcount(*day_keys)
+        pipe.delete(*temp_keys)
+        results = await pipe.execute()
+
+        hardest_raw, easiest_raw, books_raw = results[2], results[5], results[8]
+        total_passages = sum(int(count) for count in results[9] if count)
+        session_counts = {}
+        if self.session_counting == "hll":
+            # Per-day HLLs, so hourly windows count sessions over whole days
+            session_counts["totalSessions"] = results[10]
+
+        summary = self._format_summary(
+            total_passages, session_counts, hardest_raw, easiest_raw, books_raw
+        )
+        summary["window"] = window
+        return summary
+
+    def _format_summary(
+        self, total_passages: int, session_counts: Dict, hardest_raw, easiest_raw, books_raw
+    ) -> Dict:
+        hardest_words = [
+            {"word": word, "retryCount": int(score)}
+            for word, score in hardest_raw
+        ]
+        easiest_words = [
+            {"word": word, "firstTryCount": int(score)}
+            for word, score in easiest_raw
+        ]
+        popular_books = []
+        for book_key, count in books_raw:
+            parts = book_key.split("|", 1)
+            popular_books.append({
+                "title": parts[0] if parts else "Unknown",
+                "author": parts[1] if len(parts) > 1 else "Unknown",
+                "usageCount": int(count),
+            })
+
+        return {
+            "totalPassages": total_passages,
+            "totalSessions": 0,
+            **session_counts,
+            "hardestWords": hardest_words,
+            "easiestWords": easiest_words,
+            "popularBooks": popular_books,
+        }
+
     def _empty_summary(self) -> Dict:
         """Return empty summary structure"""
         return {
@@ -211,7 +869,7 @@ class RedisAnalyticsService:
             "popularBooks": [],
         }
 
-    def get_recent_passages(self, count: int = 50) -> List[Dict]:
+    async def get_recent_passages(self, count: int = 50) -> List[Dict]:
         """
         Get recent passage attempts for display/export.
 
@@ -221,54 +879,164 @@ class RedisAnalyticsService:
         Returns:
             List of passage analytics records (newest first)
         """
+        passages, _ = await self.get_recent_page(count)
+        return passages
+
+    async def get_recent_page(
+        self,
+        count: int = 50,
+        cursor: Optional[str] = None,
+        book: Optional[str] = None,
+        level: Optional[int] = None,
+        passed: Optional[bool] = None,
+        scan_limit: int = 2000,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Page backwards through passage attempts, newest first.
+
+        Args:
+            count: Maximum records to return
+            cursor: Exclusive stream ID to continue before (a previous nextCursor)
+            book: Case-insensitive substring of the book title
+            level: Exact game level
+            passed: Only passed (True) or failed (False) attempts
+            scan_limit: Maximum stream entries examined per call, so sparse
+                filters cannot walk the whole stream in one request
+
+        Returns:
+            (records, next cursor or None once the stream is exhausted)
+        """
         if not self.redis_client:
-            return []
+            return [], None
+
+        book = book.lower() if book else None
+
+        def matches(record: Dict) -> bool:
+            if book is not None and book not in str(record.get("bookTitle", "")).lower():
+                return False
+            if level is not None and record.get("level") != level:
+                return False
+            if passed is not None and bool(record.get("passed")) != passed:
+                return False
+            return True
+
+        filtered = book is not None or level is not None or passed is not None
+        page_size = count if not filtered else min(max(count * 4, 100), scan_limit)
+        upper = f"({cursor}" if cursor else "+"
+        results: List[Dict] = []
+        scanned = 0
+        last_id = None
 
         try:
-            entries = self.redis_client.xrevrange(
-                self.STREAM_KEY, count=count
-            )
-            return [json.loads(entry[1]["data"]) for entry in entries]
+            while len(results) < count and scanned < scan_limit:
+                chunk = min(page_size, scan_limit - scanned)
+                entries = await self.redis_client.xrevrange(
+                    self.STREAM_KEY, max=upper, min="-", count=chunk
+                )
+                for entry_id, fields in entries:
+                    scanned += 1
+                    last_id = entry_id
+                    record = json.loads(fields["data"])
+                    if matches(record):
+                        results.append(record)
+                        if len(results) == count:
+                            break
+                if len(entries) < chunk and len(results) < count:
+                    # Reached the start of the stream
+                    return results, None
+                upper = f"({last_id}"
+
+            # A full page can end exactly on the oldest entry; don't hand out
+            # a cursor that would only fetch an empty page
+            oldest = await self.redis_client.xrange(self.STREAM_KEY, min="-", max="+", count=1)
+            if last_id is None or not oldest or oldest[0][0] == last_id:
+                return results, None
+            return results, last_id
 
         except redis.RedisError as e:
             logger.error(f"Failed to get recent passages: {e}")
-            return []
+            return [], None
 
-    def export_all(self) -> List[Dict]:
+    async def iter_export(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        page_size: int = 500,
+    ) -> AsyncIterator[Tuple[str, Dict]]:
         """
-        Export all analytics data for backup/analysis.
+        Stream analytics records for backup/analysis, oldest first.
+        Pages through the stream with XRANGE COUNT, so memory stays at one
+        page however long the stream is.
 
-        Returns:
-            List of all passage analytics records (oldest first)
+        Args:
+            since: Exclusive lower stream ID (pass the last exported ID for an
+                incremental backup)
+            until: Inclusive upper stream ID
+            page_size: Entries fetched per round trip
+
+        Yields:
+            (stream entry ID, passage analytics record)
+
+        Raises:
+            redis.RedisError: if a page cannot be read; callers decide whether
+                a partial export is acceptable
         """
         if not self.redis_client:
-            return []
-
-        try:
-            entries = self.redis_client.xrange(self.STREAM_KEY)
-            return [json.loads(entry[1]["data"]) for entry in entries]
+            return
 
-        except redis.RedisError as e:
-            logger.error(f"Failed to export analytics: {e}")
-            return []
+        start = f"({since}" if since else "-"
+        end = until or "+"
+        while True:
+            entries = await self.redis_client.xrange(
+                self.STREAM_KEY, min=start, max=end, count=page_size
+            )
+            for entry_id, fields in entries:
+                yield entry_id, json.loads(fields["data"])
+            if len(entries) < page_size:
+                return
+            # Exclusive cursor: resume after the last entry of this page
+            start = f"({entries[-1][0]}"
 
-    def get_word_stats(self, word: str) -> Dict:
+    async def get_word_stats(self, word: str, window: Optional[str] = None) -> Dict:
         """
         Get statistics for a specific word.
 
         Args:
             word: The word to look up
+            window: Optional time window such as "24h" or "7d"
 
         Returns:
             Dictionary with first_try_count and retry_count
+
+        Raises:
+            ValueError: for an invalid window
         """
+        if window:
+            self.parse_window(window)
         if not self.redis_client:
             return {"firstTryCount": 0, "retryCount": 0}
 
         try:
             word_lower = word.lower()
-            first_try = self.redis_client.zscore(self.WORDS_FIRST_TRY, word_lower)
-            retry = self.redis_client.zscore(self.WORDS_RETRY, word_lower)
+            if window:
+                # Sum the word's score across the window's buckets in one round trip
+                first_try_keys = self._window_keys("first_try", window)
+                retry_keys = self._window_keys("retry", window)
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key in first_try_keys + retry_keys:
+                    pipe.zscore(key, word_lower)
+                scores = await pipe.execute()
+                first_try = sum(score or 0 for score in scores[: len(first_try_keys)])
+                retry = sum(score or 0 for score in scores[len(first_try_keys):])
+                return {
+                    "word": word_lower,
+                    "firstTryCount": int(first_try),
+                    "retryCount": int(retry),
+                    "window": window,
+                }
+
+            first_try = await self.redis_client.zscore(self.WORDS_FIRST_TRY, word_lower)
+            retry = await self.redis_client.zscore(self.WORDS_RETRY, word_lower)
 
             return {
                 "word": word_lower,
@@ -280,7 +1048,55 @@ class RedisAnalyticsService:
             logger.error(f"Failed to get word stats: {e}")
             return {"firstTryCount": 0, "retryCount": 0}
 
-    def clear_analytics(self) -> bool:
+    async def get_words_stats(self, words: List[str], window: Optional[str] = None) -> List[Dict]:
+        """
+        Get first-try/retry counts for many words in one round trip (ZMSCORE).
+
+        Args:
+            words: Words to look up (case-insensitive; duplicates collapsed)
+            window: Optional time window such as "24h" or "7d"
+
+        Returns:
+            One stats dict per distinct word, in input order
+
+        Raises:
+            ValueError: for an invalid window
+        """
+        if window:
+            self.parse_window(window)
+        unique_words = list(dict.fromkeys(w.lower() for w in words if w))
+        empty = [{"word": w, "firstTryCount": 0, "retryCount": 0} for w in unique_words]
+        if not unique_words or not self.redis_client:
+            return empty
+
+        if window:
+            first_try_keys = self._window_keys("first_try", window)
+            retry_keys = self._window_keys("retry", window)
+        else:
+            first_try_keys = [self.WORDS_FIRST_TRY]
+            retry_keys = [self.WORDS_RETRY]
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key in first_try_keys + retry_keys:
+                pipe.zmscore(key, unique_words)
+            results = await pipe.execute()
+
+            def totals(rows) -> List[int]:
+                return [int(sum(row[i] or 0 for row in rows)) for i in range(len(unique_words))]
+
+            first_try = totals(results[: len(first_try_keys)])
+            retry = totals(results[len(first_try_keys):])
+            return [
+                {"word": word, "firstTryCount": first_try[i], "retryCount": retry[i]}
+                for i, word in enumerate(unique_words)
+            ]
+
+        except redis.RedisError as e:
+            logger.error(f"Failed to get word stats batch: {e}")
+            return empty
+
+    async def clear_analytics(self) -> bool:
         """
         Clear all analytics data (admin function).
 
@@ -291,12 +1107,32 @@ class RedisAnalyticsService:
             return False
 
         try:
-            self.redis_client.delete(
+            day_keys = [
+                key async for key in self.redis_client.scan_iter(
+                    match=f"{self.SESSIONS_DAY_PREFIX}*", count=1000
+                )
+            ]
+            rollup_keys = [
+                key async for key in self.redis_client.scan_iter(
+                    match=f"{self.ROLLUP_PREFIX}*", count=1000
+                )
+            ]
+            word_index_keys = [
+                key async for key in self.redis_client.scan_iter(
+                    match=f"{self.WORD_INDEX_PREFIX}*", count=1000
+                )
+            ]
+            await self.redis_client.delete(
                 self.STREAM_KEY,
                 self.WORDS_FIRST_TRY,
                 self.WORDS_RETRY,
                 self.BOOKS_KEY,
                 self.SESSIONS_KEY,
+                self.SESSIONS_HLL,
+                *day_keys,
+                *rollup_keys,
+                *word_index_keys,
+                *(f"{self.DIFFICULTY_PREFIX}{band}" for band in ("all",) + self.LEVEL_BANDS),
             )
             logger.info("Analytics data cleared")
             return True
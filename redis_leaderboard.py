@@ -3,34 +3,100 @@ Redis Leaderboard Service
 Manages leaderboard data using Redis sorted sets with HF Space fallback
 """
 
+import asyncio
 import json
 import os
 import logging
-import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 import redis
+import redis.asyncio as aioredis
 import httpx
 
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
 logger = logging.getLogger(__name__)
 
 
+# Insert one entry and trim the board to the top N in a single round trip.
+# KEYS: leaderboard zset, version counter
+# ARGV: member, score, max entries, change channel
+# Returns {rank, qualified}: rank is 1-based (0 when the entry did not place).
+# A full board is only written when the score beats the current lowest, so
+# entries that can't place never touch the set. Writes bump the version and
+# publish it so other workers drop their cached board.
+ADD_ENTRY_LUA = """
+local key = KEYS[1]
+local score = tonumber(ARGV[2])
+local max_entries = tonumber(ARGV[3])
+
+if redis.call('ZCARD', key) >= max_entries then
+  local lowest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+  if lowest[2] and score <= tonumber(lowest[2]) then
+    return {0, 0}
+  end
+end
+
+redis.call('ZADD', key, score, ARGV[1])
+redis.call('ZREMRANGEBYRANK', key, 0, -(max_entries + 1))
+redis.call('PUBLISH', ARGV[4], redis.call('INCR', KEYS[2]))
+
+local rank = redis.call('ZREVRANK', key, ARGV[1])
+if not rank then
+  return {0, 0}
+end
+return {rank + 1, 1}
+"""
+
+# Bump the leaderboard version and publish it.
+# KEYS: version counter
+# ARGV: change channel
+PUBLISH_CHANGE_LUA = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', ARGV[1], version)
+return version
+"""
+
+
 class RedisLeaderboardService:
     """
     Service for managing leaderboard data using Redis sorted sets.
     Falls back to HF Space API when Redis is unavailable.
-    Syncs to HF Space as backup on each write.
+    Syncs to HF Space as backup after writes, through one background worker
+    that debounces bursts of writes into a single upload.
+
+    The board is cached in memory per worker. Every write bumps a version
+    key and publishes it on a channel; each worker's listener drops its
+    cache on a message. After `cache_ttl` the cached board is revalidated
+    against the version key in case a message was missed.
+
+    All Redis and HF Space I/O is async (redis.asyncio / httpx.AsyncClient), so
+    a slow call never blocks the event loop. Construction does no I/O; call
+    `connect()` once from the app's startup.
     """
 
     LEADERBOARD_KEY = "cloze:leaderboard"
+    VERSION_KEY = "cloze:leaderboard:version"
+    SYNCED_VERSION_KEY = "cloze:leaderboard:synced_version"
+    SYNC_LOCK_KEY = "cloze:leaderboard:sync_lock"
+    CHANGES_CHANNEL = "cloze:leaderboard:changes"
     MAX_ENTRIES = 10
+    SYNC_MAX_ATTEMPTS = 5
+    SYNC_MAX_BACKOFF = 60.0
+    SYNC_MAX_DELAY = 30.0
+    SYNC_LOCK_TIMEOUT = 30.0
+    FALLBACK_CACHE_TTL = 10.0
+    FALLBACK_STALE_TTL = 300.0
 
     def __init__(
         self,
         redis_url: Optional[str] = None,
         hf_fallback_url: str = "https://milwright-cloze-leaderboard.hf.space",
         hf_token: Optional[str] = None,
+        cache_ttl: float = 30.0,
+        sync_debounce: float = 2.0,
     ):
         """
         Initialize Redis Leaderboard Service
@@ -39,41 +105,113 @@ class RedisLeaderboardService:
             redis_url: Redis connection URL (default: REDIS_URL env var)
             hf_fallback_url: HF Space URL for fallback operations
             hf_token: HF token for syncing to HF Space (default: HF_TOKEN env var)
+            cache_ttl: Seconds a cached board is served before it is revalidated
+                against the version key (0 disables the cache)
+            sync_debounce: Quiet period after the last write before one HF Space
+                upload (a steady stream of writes still syncs every SYNC_MAX_DELAY)
         """
         self.redis_url = redis_url or os.getenv("REDIS_URL")
         self.hf_fallback_url = hf_fallback_url
         self.hf_token = hf_token or os.getenv("HF_TOKEN")
-        self.redis_client: Optional[redis.Redis] = None
+        self.redis_client: Optional[aioredis.Redis] = None
+        self._add_entry_script = None
+
+        self.cache_ttl = cache_ttl
+        self._cache: Optional[List[Dict]] = None
+        self._cache_version: Optional[str] = None
+        self._cache_checked = 0.0
+        self._cache_generation = 0
+        self._listener_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.sync_debounce = sync_debounce
+        self._http: Optional[httpx.AsyncClient] = None
+        self._hf_breaker = CircuitBreaker("HF Space")
+        self._fallback_cache: Optional[Tuple[float, List[Dict]]] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._sync_requested: Optional[asyncio.Event] = None
+        self._dirty_since: Optional[float] = None
+        self._sync_stats = {
+            "uploads": 0,
+            "skippedStale": 0,
+            "failures": 0,
+            "consecutiveFailures": 0,
+            "lastSyncedVersion": None,
+            "lastSuccess": None,
+            "lastError": None,
+        }
+
+    async def connect(self, pool: Optional[aioredis.ConnectionPool] = None):
+        """
+        Establish the Redis connection and seed from HF Space if it is empty
 
-        self._connect_redis()
+        Args:
+            pool: Shared connection pool; a private client is created from
+                redis_url when omitted
+        """
+        await self._connect_redis(pool)
 
         if self.redis_client:
             logger.info("Redis Leaderboard Service initialized with Redis")
+            if self.cache_ttl > 0:
+                self._listener_task = asyncio.create_task(self._listen_for_changes())
+            self._sync_requested = asyncio.Event()
+            self._sync_task = asyncio.create_task(self._sync_loop())
             # Seed from HF Space if Redis is empty (data migration)
-            self._seed_from_hf_if_empty()
+            await self._seed_from_hf_if_empty()
         else:
             logger.warning("Redis unavailable, using HF Space fallback only")
 
-    def _connect_redis(self):
-        """Establish Redis connection if URL is available"""
-        if not self.redis_url:
+    async def _connect_redis(self, pool: Optional[aioredis.ConnectionPool] = None):
+        """Establish Redis connection if a pool or URL is available"""
+        if pool is None and not self.redis_url:
             logger.warning("No REDIS_URL provided")
             return
 
         try:
-            self.redis_client = redis.from_url(
-                self.redis_url,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-            )
+            if pool is not None:
+                self.redis_client = aioredis.Redis(connection_pool=pool)
+            else:
+                self.redis_client = aioredis.from_url(
+                    self.redis_url,
+                    decode_responses=True,
+                    socket_connect_timeout=5,
+                    socket_timeout=5,
+                )
             # Test connection
-            self.redis_client.ping()
+            await self.redis_client.ping()
+            self._add_entry_script = self.redis_client.register_script(ADD_ENTRY_LUA)
             logger.info(f"Connected to Redis")
         except redis.RedisError as e:
             logger.error(f"Failed to connect to Redis: {e}")
             self.redis_client = None
 
+    async def close(self):
+        """Flush a pending HF sync and release the Redis and HTTP clients"""
+        self._closing = True
+        for task in (self._listener_task, self._sync_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._listener_task = None
+        self._sync_task = None
+        if self._dirty_since is not None and self.redis_client:
+            # One last attempt, skipping the debounce
+            if self._sync_requested is not None:
+                self._sync_requested.clear()
+            try:
+                await asyncio.wait_for(self._sync_to_hf(), timeout=10.0)
+            except Exception as e:
+                logger.warning(f"Final HF Space sync failed: {e}")
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self.redis_client:
+            # Leaves a shared pool open; its owner disconnects it
+            await self.redis_client.aclose()
+            self.redis_client = None
+            self._add_entry_script = None
+
     def _compute_score(self, level: int, round_num: int, passages: int) -> float:
         """
         Compute composite score for Redis sorted set ordering.
@@ -95,27 +233,143 @@ class RedisLeaderboardService:
         """Convert Redis sorted set member back to entry dict"""
         return json.loads(member)
 
-    def get_leaderboard(self) -> List[Dict]:
+    def _normalize_entry(self, entry: Dict) -> Dict:
+        """Fill defaults so every stored entry has the same shape"""
+        return {
+            "initials": entry.get("initials", "???"),
+            "level": entry.get("level", 1),
+            "round": entry.get("round", 1),
+            "passagesPassed": entry.get("passagesPassed", 0),
+            "date": entry.get("date") or datetime.utcnow().isoformat(),
+        }
+
+    def _entry_score(self, entry: Dict) -> float:
+        return self._compute_score(entry["level"], entry["round"], entry["passagesPassed"])
+
+    async def _bulk_replace(self, entries: List[Dict]) -> int:
+        """
+        Replace the whole board in one MULTI/EXEC, so readers see either the
+        old board or the new one, never a half-filled set.
+
+        Returns:
+            Number of entries written
+        """
+        mapping = {}
+        for entry in entries[: self.MAX_ENTRIES]:
+            normalized = self._normalize_entry(entry)
+            mapping[self._entry_to_member(normalized)] = self._entry_score(normalized)
+
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(self.LEADERBOARD_KEY)
+        if mapping:
+            pipe.zadd(self.LEADERBOARD_KEY, mapping)
+        # EVAL rather than the registered script: a Script on a pipeline sends
+        # SCRIPT EXISTS first, which would add a round trip
+        pipe.eval(PUBLISH_CHANGE_LUA, 1, self.VERSION_KEY, self.CHANGES_CHANNEL)
+        await pipe.execute()
+        self.invalidate_cache()
+        return len(mapping)
+
+    # ===== READ CACHE =====
+
+    def invalidate_cache(self):
+        """Drop the cached board; the next read goes to Redis"""
+        self._cache_generation += 1
+        self._cache = None
+        self._cache_version = None
+
+    async def _listen_for_changes(self):
+        """Drop the cached board whenever any worker publishes a change"""
+        # Polls with a timeout and checks the closing flag rather than relying
+        # on cancellation alone, which a blocked pub/sub read can swallow
+        while self.redis_client and not self._closing:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.CHANGES_CHANNEL)
+                # Changes made while we were not subscribed were missed
+                self.invalidate_cache()
+                while not self._closing:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        self.invalidate_cache()
+            except redis.RedisError as e:
+                self.invalidate_cache()
+                if self._closing:
+                    break
+                logger.warning(f"Leaderboard change listener error, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _read_leaderboard(self) -> List[Dict]:
+        """Read the board and its version together, refreshing the cache"""
+        generation = self._cache_generation
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.get(self.VERSION_KEY)
+        # Get top entries from sorted set (highest scores first)
+        pipe.zrevrange(self.LEADERBOARD_KEY, 0, self.MAX_ENTRIES - 1)
+        version, members = await pipe.execute()
+        entries = [self._member_to_entry(m) for m in members]
+
+        # Don't cache a board read across an invalidation
+        if self.cache_ttl > 0 and generation == self._cache_generation:
+            self._cache = entries
+            self._cache_version = version
+            self._cache_checked = time.monotonic()
+        return entries
+
+    async def get_leaderboard(self) -> List[Dict]:
         """
         Get current leaderboard data (top 10 entries)
 
+        Repeated reads return the same cached list object until the board
+        changes, so callers may memoize work derived from it by identity and
+        must not mutate it.
+
         Returns:
             List of leaderboard entries sorted by rank (best first)
         """
         if self.redis_client:
             try:
-                # Get top entries from sorted set (highest scores first)
-                members = self.redis_client.zrevrange(
-                    self.LEADERBOARD_KEY, 0, self.MAX_ENTRIES - 1
-                )
-                return [self._member_to_entry(m) for m in members]
+                if self._cache is not None:
+                    if time.monotonic() - self._cache_checked < self.cache_ttl:
+                        return self._cache
+                    # Safety net for missed messages: one GET instead of a full read
+                    cached = self._cache
+                    version = await self.redis_client.get(self.VERSION_KEY)
+                    if version == self._cache_version and self._cache is cached:
+                        self._cache_checked = time.monotonic()
+                        return cached
+                return await self._read_leaderboard()
             except redis.RedisError as e:
                 logger.error(f"Redis error in get_leaderboard: {e}")
                 # Fall through to HF fallback
 
-        return self._fallback_get()
+        return await self._fallback_get()
 
-    def add_entry(self, entry: Dict) -> bool:
+    async def qualifies(self, level: int, round_num: int, passages: int) -> bool:
+        """
+        Check whether a score would place, without writing.
+        A score qualifies while the board has free slots or when it beats the
+        current lowest score (ties do not displace an existing entry).
+        """
+        if not self.redis_client:
+            return True
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zcard(self.LEADERBOARD_KEY)
+            pipe.zrange(self.LEADERBOARD_KEY, 0, 0, withscores=True)
+            size, lowest = await pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Redis error in qualifies: {e}")
+            return True
+
+        if size < self.MAX_ENTRIES or not lowest:
+            return True
+        return self._compute_score(level, round_num, passages) > lowest[0][1]
+
+    async def add_entry(self, entry: Dict) -> Optional[Dict]:
         """
         Add new entry to leaderboard
 
@@ -123,53 +377,47 @@ class RedisLeaderboardService:
             entry: Leaderboard entry with keys: initials, level, round, passagesPassed
 
         Returns:
-            True if successful, False otherwise
+            {"qualified": bool, "rank": Optional[int]} if the request succeeded
+            (rank is None when it is unknown, e.g. via HF Space fallback),
+            None otherwise
         """
-        # Normalize entry
-        normalized = {
-            "initials": entry.get("initials", "???"),
-            "level": entry.get("level", 1),
-            "round": entry.get("round", 1),
-            "passagesPassed": entry.get("passagesPassed", 0),
-            "date": entry.get("date") or datetime.utcnow().isoformat(),
-        }
+        normalized = self._normalize_entry(entry)
 
         if self.redis_client:
             try:
-                score = self._compute_score(
-                    normalized["level"],
-                    normalized["round"],
-                    normalized["passagesPassed"],
-                )
+                score = self._entry_score(normalized)
                 member = self._entry_to_member(normalized)
 
-                # Add to sorted set
-                self.redis_client.zadd(self.LEADERBOARD_KEY, {member: score})
-
-                # Trim to top N entries (remove lowest scores)
-                # zremrangebyrank removes by rank (0 = lowest score)
-                current_size = self.redis_client.zcard(self.LEADERBOARD_KEY)
-                if current_size > self.MAX_ENTRIES:
-                    self.redis_client.zremrangebyrank(
-                        self.LEADERBOARD_KEY, 0, current_size - self.MAX_ENTRIES - 1
+                # Insert and trim to top N atomically
+                rank, qualified = await self._add_entry_script(
+                    keys=[self.LEADERBOARD_KEY, self.VERSION_KEY],
+                    args=[member, score, self.MAX_ENTRIES, self.CHANGES_CHANNEL],
+                )
+                if not qualified:
+                    logger.info(
+                        f"Entry did not place: {normalized['initials']} - Level {normalized['level']}"
                     )
+                    return {"qualified": False, "rank": None}
 
+                self.invalidate_cache()
                 logger.info(
-                    f"Added entry to Redis: {normalized['initials']} - Level {normalized['level']}"
+                    f"Added entry to Redis: {normalized['initials']} - Level {normalized['level']} (rank {rank})"
                 )
 
                 # Sync to HF Space in background (non-blocking)
-                self._async_sync_to_hf()
+                self._request_sync()
 
-                return True
+                return {"qualified": True, "rank": int(rank)}
 
             except redis.RedisError as e:
                 logger.error(f"Redis error in add_entry: {e}")
                 # Fall through to HF fallback
 
-        return self._fallback_add(normalized)
+        if await self._fallback_add(normalized):
+            return {"qualified": True, "rank": None}
+        return None
 
-    def update_leaderboard(self, entries: List[Dict]) -> bool:
+    async def update_leaderboard(self, entries: List[Dict]) -> bool:
         """
         Replace entire leaderboard with new data
 
@@ -181,39 +429,20 @@ class RedisLeaderboardService:
         """
         if self.redis_client:
             try:
-                # Clear existing leaderboard
-                self.redis_client.delete(self.LEADERBOARD_KEY)
-
-                # Add all entries
-                for entry in entries[: self.MAX_ENTRIES]:
-                    normalized = {
-                        "initials": entry.get("initials", "???"),
-                        "level": entry.get("level", 1),
-                        "round": entry.get("round", 1),
-                        "passagesPassed": entry.get("passagesPassed", 0),
-                        "date": entry.get("date") or datetime.utcnow().isoformat(),
-                    }
-                    score = self._compute_score(
-                        normalized["level"],
-                        normalized["round"],
-                        normalized["passagesPassed"],
-                    )
-                    member = self._entry_to_member(normalized)
-                    self.redis_client.zadd(self.LEADERBOARD_KEY, {member: score})
-
+                await self._bulk_replace(entries)
                 logger.info(f"Updated leaderboard with {len(entries)} entries")
 
                 # Sync to HF Space
-                self._async_sync_to_hf()
+                self._request_sync()
 
                 return True
 
             except redis.RedisError as e:
                 logger.error(f"Redis error in update_leaderboard: {e}")
 
-        return self._fallback_update(entries)
+        return await self._fallback_update(entries)
 
-    def clear_leaderboard(self) -> bool:
+    async def clear_leaderboard(self) -> bool:
         """
         Clear all leaderboard data (admin function)
 
@@ -222,119 +451,249 @@ class RedisLeaderboardService:
         """
         if self.redis_client:
             try:
-                self.redis_client.delete(self.LEADERBOARD_KEY)
+                await self._bulk_replace([])
                 logger.info("Leaderboard cleared from Redis")
 
                 # Sync empty state to HF Space
-                self._async_sync_to_hf()
+                self._request_sync()
 
                 return True
 
             except redis.RedisError as e:
                 logger.error(f"Redis error in clear_leaderboard: {e}")
 
-        return self._fallback_clear()
+        return await self._fallback_clear()
 
     # ===== HF SPACE FALLBACK METHODS =====
 
-    def _fallback_get(self) -> List[Dict]:
-        """Fetch leaderboard from HF Space when Redis unavailable"""
+    def _http_client(self) -> httpx.AsyncClient:
+        """Shared pooled client for HF Space calls, created on first use"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, connect=3.0),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        return self._http
+
+    async def _hf_request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Call the HF Space through the circuit breaker.
+        Request errors, 429 and 5xx count as failures; while the circuit is
+        open this raises CircuitOpenError without touching the network.
+        """
+        if not self._hf_breaker.allow():
+            raise CircuitOpenError("HF Space circuit open")
         try:
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.get(f"{self.hf_fallback_url}/api/leaderboard")
-                resp.raise_for_status()
-                data = resp.json()
-                return data.get("leaderboard", [])
+            resp = await self._http_client().request(method, f"{self.hf_fallback_url}{path}", **kwargs)
+        except Exception as e:
+            self._hf_breaker.record_failure(str(e) or type(e).__name__)
+            raise
+        except BaseException:
+            # Cancelled: no verdict on the HF Space, but free a half-open probe
+            self._hf_breaker.release()
+            raise
+        if resp.status_code == 429 or resp.status_code >= 500:
+            self._hf_breaker.record_failure(f"HTTP {resp.status_code}")
+        else:
+            self._hf_breaker.record_success()
+        resp.raise_for_status()
+        return resp
+
+    async def _fallback_get(self, use_cache: bool = True) -> List[Dict]:
+        """
+        Fetch leaderboard from HF Space when Redis unavailable.
+        The last good board is reused for FALLBACK_CACHE_TTL seconds, and for
+        up to FALLBACK_STALE_TTL seconds when the HF Space is failing.
+        """
+        cached = self._fallback_cache if use_cache else None
+        age = time.monotonic() - cached[0] if cached else None
+        if cached and age < self.FALLBACK_CACHE_TTL:
+            return cached[1]
+
+        try:
+            resp = await self._hf_request("GET", "/api/leaderboard")
+            entries = resp.json().get("leaderboard", [])
+            self._fallback_cache = (time.monotonic(), entries)
+            return entries
+        except CircuitOpenError as e:
+            logger.debug(f"HF Space fallback get skipped: {e}")
         except Exception as e:
             logger.error(f"HF Space fallback get failed: {e}")
-            return []
 
-    def _fallback_add(self, entry: Dict) -> bool:
+        if cached and age < self.FALLBACK_STALE_TTL:
+            return cached[1]
+        return []
+
+    async def _fallback_add(self, entry: Dict) -> bool:
         """Add entry via HF Space when Redis unavailable"""
         try:
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.post(
-                    f"{self.hf_fallback_url}/api/leaderboard/add",
-                    json=entry,
-                )
-                resp.raise_for_status()
-                return True
+            await self._hf_request("POST", "/api/leaderboard/add", json=entry)
+            self._fallback_cache = None
+            return True
         except Exception as e:
             logger.error(f"HF Space fallback add failed: {e}")
             return False
 
-    def _fallback_update(self, entries: List[Dict]) -> bool:
+    async def _fallback_update(self, entries: List[Dict]) -> bool:
         """Update leaderboard via HF Space when Redis unavailable"""
         try:
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.post(
-                    f"{self.hf_fallback_url}/api/leaderboard/update",
-                    json=entries,
-                )
-                resp.raise_for_status()
-                return True
+            await self._hf_request("POST", "/api/leaderboard/update", json=entries)
+            self._fallback_cache = None
+            return True
         except Exception as e:
             logger.error(f"HF Space fallback update failed: {e}")
             return False
 
-    def _fallback_clear(self) -> bool:
+    async def _fallback_clear(self) -> bool:
         """Clear leaderboard via HF Space when Redis unavailable"""
         try:
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.delete(f"{self.hf_fallback_url}/api/leaderboard/clear")
-                resp.raise_for_status()
-                return True
+            await self._hf_request("DELETE", "/api/leaderboard/clear")
+            self._fallback_cache = None
+            return True
         except Exception as e:
             logger.error(f"HF Space fallback clear failed: {e}")
             return False
 
     # ===== HF SPACE SYNC (BACKGROUND) =====
 
-    def _async_sync_to_hf(self):
-        """Sync current leaderboard to HF Space in background thread"""
-        thread = threading.Thread(target=self._sync_to_hf, daemon=True)
-        thread.start()
+    def _request_sync(self):
+        """Mark the board dirty; the sync worker uploads it after the debounce"""
+        if self._dirty_since is None:
+            self._dirty_since = time.time()
+        if self._sync_requested is not None:
+            self._sync_requested.set()
+
+    async def _debounce(self):
+        """Wait until no write has arrived for `sync_debounce` seconds (capped at SYNC_MAX_DELAY)"""
+        deadline = time.monotonic() + self.SYNC_MAX_DELAY
+        while True:
+            self._sync_requested.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(
+                    self._sync_requested.wait(), min(self.sync_debounce, remaining)
+                )
+            except asyncio.TimeoutError:
+                return
 
-    def _sync_to_hf(self):
+    async def _sync_loop(self):
         """
-        Sync current Redis leaderboard to HF Space.
-        This keeps HF Space as a backup of the Redis data.
+        Single background worker for HF Space backups.
+        Writes arriving during the debounce window or an upload coalesce
+        into the next upload; failed or lock-busy uploads are retried with
+        backoff, and re-queued after the last attempt so a pending board is
+        never left unsynced until the next write.
+        """
+        while True:
+            await self._sync_requested.wait()
+            await self._debounce()
+
+            delay = 1.0
+            for attempt in range(1, self.SYNC_MAX_ATTEMPTS + 1):
+                try:
+                    if await self._sync_to_hf():
+                        break
+                    # Another worker is uploading; its snapshot may predate our write
+                    logger.debug(f"HF Space sync busy elsewhere, retrying in {delay:.0f}s")
+                except Exception as e:
+                    self._sync_stats["failures"] += 1
+                    self._sync_stats["consecutiveFailures"] += 1
+                    self._sync_stats["lastError"] = str(e) or type(e).__name__
+                    if attempt == self.SYNC_MAX_ATTEMPTS:
+                        # Non-critical - HF Space is just backup
+                        logger.warning(f"HF Space sync failed after {attempt} attempts: {e}")
+                    else:
+                        logger.debug(f"HF Space sync failed, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.SYNC_MAX_BACKOFF)
+            else:
+                # Out of attempts with the board still dirty: go round again
+                if self._dirty_since is not None:
+                    self._sync_requested.set()
+
+    async def _sync_to_hf(self) -> bool:
+        """
+        Upload the current Redis leaderboard to HF Space.
+        This keeps HF Space as a backup of the Redis data. Uploads from all
+        workers are serialized by a Redis lock; the board and its version are
+        read while holding it, a version not newer than the last uploaded one
+        is skipped, and the synced version is only advanced after the upload
+        succeeds. So a stale snapshot never overwrites a newer one, and a
+        failed upload is retried.
+
+        Returns:
+            False if another worker holds the sync lock, True otherwise
         """
         if not self.redis_client:
-            return
+            return True
 
+        lock = self.redis_client.lock(self.SYNC_LOCK_KEY, timeout=self.SYNC_LOCK_TIMEOUT)
+        if not await lock.acquire(blocking=False):
+            return False
         try:
-            # Get current leaderboard from Redis
-            entries = self.get_leaderboard()
-
-            # POST to HF Space
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.post(
-                    f"{self.hf_fallback_url}/api/leaderboard/update",
-                    json=entries,
+            pipe = self.redis_client.pipeline(transaction=True)
+            pipe.get(self.VERSION_KEY)
+            pipe.get(self.SYNCED_VERSION_KEY)
+            pipe.zrevrange(self.LEADERBOARD_KEY, 0, self.MAX_ENTRIES - 1)
+            version, synced, members = await pipe.execute()
+            version = int(version or 0)
+            dirty_since = self._dirty_since
+
+            if synced is not None and version <= int(synced):
+                self._sync_stats["skippedStale"] += 1
+                logger.debug(f"HF Space already has version {synced}, skipping {version}")
+            else:
+                # Bounded by the client timeout, well inside SYNC_LOCK_TIMEOUT
+                await self._hf_request(
+                    "POST",
+                    "/api/leaderboard/update",
+                    json=[self._member_to_entry(m) for m in members],
                 )
-                if resp.status_code == 200:
-                    logger.debug("Synced leaderboard to HF Space")
-                else:
-                    logger.warning(f"HF Space sync returned {resp.status_code}")
-
-        except Exception as e:
-            # Non-critical - HF Space is just backup
-            logger.debug(f"HF Space sync failed (non-critical): {e}")
+                await self.redis_client.set(self.SYNCED_VERSION_KEY, version)
+                self._sync_stats["uploads"] += 1
+                self._sync_stats["lastSyncedVersion"] = version
+                self._sync_stats["lastSuccess"] = datetime.utcnow().isoformat()
+                logger.debug(f"Synced leaderboard version {version} to HF Space")
+        finally:
+            try:
+                await lock.release()
+            except redis.RedisError as e:
+                logger.warning(f"HF Space sync lock expired before release: {e}")
+
+        self._sync_stats["consecutiveFailures"] = 0
+        # Writes made after the snapshot stay pending
+        if self._dirty_since == dirty_since and not (
+            self._sync_requested is not None and self._sync_requested.is_set()
+        ):
+            self._dirty_since = None
+        return True
+
+    def sync_status(self) -> Dict:
+        """HF Space backup status: pending changes, lag and recent outcomes"""
+        return {
+            **self._sync_stats,
+            "running": self._sync_task is not None and not self._sync_task.done(),
+            "pending": self._dirty_since is not None,
+            "lagSeconds": round(time.time() - self._dirty_since, 1) if self._dirty_since else 0.0,
+            "debounceSeconds": self.sync_debounce,
+            "circuit": self._hf_breaker.stats(),
+        }
 
-    def is_redis_available(self) -> bool:
+    async def is_redis_available(self) -> bool:
         """Check if Redis connection is active"""
         if not self.redis_client:
             return False
         try:
-            self.redis_client.ping()
+            await self.redis_client.ping()
             return True
         except redis.RedisError:
             return False
 
     # ===== DATA MIGRATION =====
 
-    def _seed_from_hf_if_empty(self):
+    async def _seed_from_hf_if_empty(self):
         """
         Seed Redis from HF Space if Redis leaderboard is empty.
         This ensures existing leaderboard data is preserved during migration.
@@ -344,36 +703,21 @@ class RedisLeaderboardService:
 
         try:
             # Check if Redis already has data
-            current_count = self.redis_client.zcard(self.LEADERBOARD_KEY)
+            current_count = await self.redis_client.zcard(self.LEADERBOARD_KEY)
             if current_count > 0:
                 logger.info(f"Redis already has {current_count} entries, skipping HF seed")
                 return
 
             # Fetch from HF Space
             logger.info("Redis empty, seeding from HF Space...")
-            hf_entries = self._fallback_get()
+            hf_entries = await self._fallback_get(use_cache=False)
 
             if not hf_entries:
                 logger.info("No entries in HF Space to seed")
                 return
 
             # Add all entries to Redis
-            for entry in hf_entries[: self.MAX_ENTRIES]:
-                normalized = {
-                    "initials": entry.get("initials", "???"),
-                    "level": entry.get("level", 1),
-                    "round": entry.get("round", 1),
-                    "passagesPassed": entry.get("passagesPassed", 0),
-                    "date": entry.get("date") or datetime.utcnow().isoformat(),
-                }
-                score = self._compute_score(
-                    normalized["level"],
-                    normalized["round"],
-                    normalized["passagesPassed"],
-                )
-                member = self._entry_to_member(normalized)
-                self.redis_client.zadd(self.LEADERBOARD_KEY, {member: score})
-
+            await self._bulk_replace(hf_entries)
             logger.info(f"Seeded Redis with {len(hf_entries)} entries from HF Space")
 
         except redis.RedisError as e:
@@ -381,7 +725,7 @@ class RedisLeaderboardService:
         except Exception as e:
             logger.error(f"Unexpected error during HF seed: {e}")
 
-    def force_seed_from_hf(self) -> bool:
+    async def force_seed_from_hf(self) -> bool:
         """
         Force re-seed Redis from HF Space (admin function).
         Clears existing Redis data and pulls fresh from HF Space.
@@ -395,30 +739,13 @@ class RedisLeaderboardService:
 
         try:
             # Fetch from HF Space first
-            hf_entries = self._fallback_get()
+            hf_entries = await self._fallback_get(use_cache=False)
             if not hf_entries:
                 logger.warning("No entries in HF Space to seed")
                 return False
 
-            # Clear Redis and repopulate
-            self.redis_client.delete(self.LEADERBOARD_KEY)
-
-            for entry in hf_entries[: self.MAX_ENTRIES]:
-                normalized = {
-                    "initials": entry.get("initials", "???"),
-                    "level": entry.get("level", 1),
-                    "round": entry.get("round", 1),
-                    "passagesPassed": entry.get("passagesPassed", 0),
-                    "date": entry.get("date") or datetime.utcnow().isoformat(),
-                }
-                score = self._compute_score(
-                    normalized["level"],
-                    normalized["round"],
-                    normalized["passagesPassed"],
-                )
-                member = self._entry_to_member(normalized)
-                self.redis_client.zadd(self.LEADERBOARD_KEY, {member: score})
-
+            # Replace Redis data in one transaction
+            await self._bulk_replace(hf_entries)
             logger.info(f"Force-seeded Redis with {len(hf_entries)} entries from HF Space")
             return True
 
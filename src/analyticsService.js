@@ -344,6 +344,31 @@ export class AnalyticsService {
       throw error;
     }
   }
+
+  /**
+   * Get statistics for many words in one request.
+   * @param {string[]} words
+   * @param {string} [window] - Optional time window, e.g. '24h' or '7d'
+   * @returns {Promise<Object>}
+   */
+  async getWordsStats(words, window = null) {
+    try {
+      const response = await fetch(`${this.baseUrl}/api/analytics/words`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(window ? { words, window } : { words })
+      });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      return await response.json();
+    } catch (error) {
+      console.error('📊 Analytics: Failed to get word stats batch', error);
+      throw error;
+    }
+  }
 }
 
 // Export singleton instance
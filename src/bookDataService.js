@@ -13,6 +13,9 @@ class HuggingFaceDatasetService {
     this.cache = new Map();
     this.preloadedBooks = [];
     this.usedBooks = new Set(); // Track books used this session
+    this.passagePoolEnabled = false; // server-side pre-extracted passages (/api/passages)
+    // Only fetch what a round uses: metadata plus a window from the middle of the book
+    this.rowProjection = 'fields=id,title,author,text&text_window=random:20000';
   }
 
   // Local fallback books for when HF streaming is unavailable
@@ -93,13 +96,18 @@ class HuggingFaceDatasetService {
 
   async loadDataset() {
     try {
+      // Prefer the server passage pool: a round then costs a few hundred bytes, not a whole book
+      await this.initializePassagePool();
+
       // Try to connect to HF Datasets API
       await this.initializeStreaming();
       
       if (this.streamingEnabled) {
-        // Preload some books for immediate access
-        await this.preloadBooks(2);
-        if (this.preloadedBooks.length > 0) {
+        // Preload some books for immediate access (only needed without the passage pool)
+        if (!this.passagePoolEnabled) {
+          await this.preloadBooks(2);
+        }
+        if (this.preloadedBooks.length > 0 || this.passagePoolEnabled) {
         } else {
           // Fast fallback if HF is slow/unavailable
           console.warn('HF streaming returned 0 books; falling back to local samples for this session');
@@ -122,10 +130,41 @@ class HuggingFaceDatasetService {
     }
   }
 
+  async initializePassagePool() {
+    try {
+      const response = await this.fetchWithTimeout('/api/passages/stats', { timeoutMs: 3000 });
+      this.passagePoolEnabled = response.ok;
+    } catch (error) {
+      this.passagePoolEnabled = false;
+    }
+  }
+
+  // Fetch a pre-extracted, quality-scored passage; null if the pool can't serve one
+  async getPooledPassage(level) {
+    if (!this.passagePoolEnabled) return null;
+    try {
+      const url = `/api/passages/random?level=${encodeURIComponent(level)}`;
+      const response = await this.fetchWithTimeout(url, { timeoutMs: 8000 });
+      if (response.ok) {
+        const data = await response.json();
+        if (data.success && data.passage && data.passage.text) {
+          const { id, title, author, text } = data.passage;
+          this.usedBooks.add(this.getBookId({ title, author }));
+          return { id, title, author, text, source: 'passage_pool', processed: true };
+        }
+      }
+    } catch (error) {
+      console.warn('Passage pool request failed:', error);
+    }
+    // Don't keep paying the timeout on every round once the pool has failed
+    this.passagePoolEnabled = false;
+    return null;
+  }
+
   async initializeStreaming() {
     try {
       // Test HF Datasets API availability
-      const testUrl = `${this.proxyBase}/splits?dataset=${encodeURIComponent(this.datasetName)}`;
+      const testUrl = `${this.proxyBase}/splits?dataset=${encodeURIComponent(this.datasetName)}&stale_while_revalidate=3600&stale_if_error=86400`;
       const response = await this.fetchWithTimeout(testUrl, { timeoutMs: 3000 });
       
       if (response.ok) {
@@ -170,7 +209,7 @@ class HuggingFaceDatasetService {
     try {
       // Use random offset to avoid always getting the same books
       const randomOffset = Math.floor(Math.random() * 1000);
-      const url = `${this.proxyBase}/rows?dataset=${encodeURIComponent(this.datasetName)}&config=${encodeURIComponent(this.hfConfig)}&split=${encodeURIComponent(this.hfSplit)}&offset=${randomOffset}&length=${count}`;
+      const url = `${this.proxyBase}/rows?dataset=${encodeURIComponent(this.datasetName)}&config=${encodeURIComponent(this.hfConfig)}&split=${encodeURIComponent(this.hfSplit)}&offset=${randomOffset}&length=${count}&${this.rowProjection}`;
 
       // Use retry logic with 20s timeout to handle slow HF API
       const response = await this.retryFetch(
@@ -192,7 +231,7 @@ class HuggingFaceDatasetService {
         this.preloadedBooks = data.rows
           .map(row => {
             try {
-              return this.processHFBookLazy(row.row);
+              return this.processHFBookLazy(row.row, row.truncated_cells);
             } catch (e) {
               console.warn('Error processing book:', e);
               return null;
@@ -208,14 +247,15 @@ class HuggingFaceDatasetService {
     }
   }
 
-  processHFBookLazy(rowData) {
+  processHFBookLazy(rowData, truncatedCells = []) {
     // Minimal processing - defer text cleaning and validation until book is selected
     const rawText = rowData.text || '';
     
-    // Do basic metadata extraction to get proper title/author
-    const extractedMetadata = this.extractMetadata(rawText);
-    const title = extractedMetadata.title || rowData.title || 'Classic Literature';
-    const author = extractedMetadata.author || rowData.author || 'Unknown Author';
+    // The proxy extracts title/author from the full book; a text window from the
+    // middle has no Gutenberg header, so only parse the text when they are missing
+    const extractedMetadata = (rowData.title && rowData.author) ? {} : this.extractMetadata(rawText);
+    const title = rowData.title || extractedMetadata.title || 'Classic Literature';
+    const author = rowData.author || extractedMetadata.author || 'Unknown Author';
     
     return {
       id: rowData.id || Math.random().toString(36),
@@ -225,6 +265,7 @@ class HuggingFaceDatasetService {
       text: null, // Will clean when needed
       language: rowData.language || 'en',
       source: 'project_gutenberg',
+      fragment: Array.isArray(truncatedCells) && truncatedCells.includes('text'),
       processed: false
     };
   }
@@ -235,7 +276,9 @@ class HuggingFaceDatasetService {
     const startTime = Date.now();
     
     // Clean text when actually needed
-    const cleanedText = this.cleanProjectGutenbergText(book.rawText);
+    const cleanedText = book.fragment
+      ? this.cleanTextFragment(book.rawText)
+      : this.cleanProjectGutenbergText(book.rawText);
     
     book.text = cleanedText;
     book.processed = true;
@@ -347,8 +390,32 @@ class HuggingFaceDatasetService {
     return cleaned;
   }
 
+  // A window from the middle of a book: no Gutenberg header/footer to strip or
+  // front matter to skip, but it starts and ends mid-line
+  cleanTextFragment(text) {
+    if (!text) return '';
+
+    const firstBreak = text.indexOf('\n');
+    const lastBreak = text.lastIndexOf('\n');
+    const whole = firstBreak !== -1 && lastBreak > firstBreak
+      ? text.substring(firstBreak + 1, lastBreak)
+      : text;
+
+    return whole
+      .replace(/\r\n/g, '\n')
+      .replace(/\n\s*\n\s*\n+/g, '\n\n')
+      .replace(/^\s*CHAPTER.*$/gm, '')
+      .replace(/^\s*Chapter.*$/gm, '')
+      .replace(/^\s*\d+\s*$/gm, '')
+      .replace(/^\s*\[.*?\]\s*$/gm, '')
+      .replace(/^\s*_.*_\s*$/gm, '')
+      .replace(/[_*]/g, '')
+      .trim();
+  }
+
+  // Returns null fields when the text carries no recognizable metadata
   extractMetadata(text) {
-    const metadata = { title: 'Classic Literature', author: 'Unknown Author' };
+    const metadata = { title: null, author: null };
     
     if (!text) return metadata;
     
@@ -535,7 +602,7 @@ class HuggingFaceDatasetService {
     try {
       if (!this.streamingEnabled) return null;
       const offset = Math.floor(Math.random() * 1000);
-      const url = `${this.proxyBase}/rows?dataset=${encodeURIComponent(this.datasetName)}&config=${encodeURIComponent(this.hfConfig)}&split=${encodeURIComponent(this.hfSplit)}&offset=${offset}&length=1`;
+      const url = `${this.proxyBase}/rows?dataset=${encodeURIComponent(this.datasetName)}&config=${encodeURIComponent(this.hfConfig)}&split=${encodeURIComponent(this.hfSplit)}&offset=${offset}&length=1&${this.rowProjection}`;
 
       const response = await this.retryFetch(
         () => this.fetchWithTimeout(url, { timeoutMs: 10000 }),
@@ -546,7 +613,7 @@ class HuggingFaceDatasetService {
       if (response.ok) {
         const data = await response.json();
         if (data.rows && data.rows.length > 0) {
-          const book = this.processHFBookLazy(data.rows[0].row);
+          const book = this.processHFBookLazy(data.rows[0].row, data.rows[0].truncated_cells);
           return await this.processBookOnDemand(book);
         }
       }
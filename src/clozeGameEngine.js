@@ -76,11 +76,14 @@ class ClozeGame {
       this.attemptCounts = {};
       this.lockedBlanks = new Set();
 
-      // Get one book for this round based on current level criteria
-      const book = await bookDataService.getBookByLevelCriteria(this.currentLevel);
+      // Prefer a passage the server already extracted and quality-checked
+      const pooled = await bookDataService.getPooledPassage(this.currentLevel);
+
+      // Otherwise get one book for this round based on current level criteria
+      const book = pooled || await bookDataService.getBookByLevelCriteria(this.currentLevel);
 
       // Extract passage from book
-      const passage = this.extractCoherentPassage(book.text);
+      const passage = pooled ? pooled.text : this.extractCoherentPassage(book.text);
 
       // Store book and passage (normalize whitespace to prevent compound words)
       this.currentBook = book;